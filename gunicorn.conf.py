@@ -0,0 +1,29 @@
+"""Gunicorn settings, read from the working directory on startup.
+
+With PROMETHEUS_MULTIPROC_DIR set, the workers share their metrics through
+files in that directory (see website/metrics.py).
+"""
+
+import os
+import shutil
+
+from prometheus_client import multiprocess
+
+# The site is served through ASGI, so that each worker runs a single event
+# loop: pages waiting on the ESV API don't hold up a worker, and share its
+# pool of connections (and any fetch of the same passage already underway).
+wsgi_app = "website.asgi:application"
+worker_class = "uvicorn.workers.UvicornWorker"
+
+
+def on_starting(server):
+    # Samples left over from the last run would be counted again
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
@@ -4,3 +4,27 @@ from django.apps import AppConfig
 class LectionaryConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "lectionary"
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_migrate, post_save
+        from django.test.signals import setting_changed
+
+        from lectionary.services.calendar import (
+            collect_changed,
+            day_changed,
+            day_link_changed,
+            lesson_changed,
+            rebuild_calendar_entries,
+        )
+        from lectionary.services.scripture import reset_provider
+
+        for signal in (post_save, post_delete):
+            signal.connect(day_changed, sender="lectionary.Day")
+            signal.connect(day_link_changed, sender="lectionary.DayLesson")
+            signal.connect(day_link_changed, sender="lectionary.DayCollect")
+        # Deleting a lesson or collect deletes its links to days, which are
+        # handled above
+        post_save.connect(lesson_changed, sender="lectionary.Lesson")
+        post_save.connect(collect_changed, sender="lectionary.Collect")
+        post_migrate.connect(rebuild_calendar_entries, sender=self)
+        setting_changed.connect(reset_provider)
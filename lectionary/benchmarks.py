@@ -0,0 +1,230 @@
+"""Benchmarks of the hot paths of the site, run with `manage.py benchmark`.
+
+Each case is timed over a number of repetitions (after one untimed run to
+warm up imports and templates), and the queries of its last run counted.
+The suite runs against the configured database, inside a transaction which
+is rolled back at the end, with its own in-memory cache and a stub of the
+ESV API on localhost, so that it neither changes nor depends on anything
+outside of the data itself.
+"""
+
+import datetime as dt
+import json
+import statistics
+import threading
+import time
+from collections.abc import Callable
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+from dateutil.relativedelta import relativedelta
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from lectionary.models import Day, Lesson
+from lectionary.services import scripture
+from lectionary.services.lectionary import Lectionary, get_liturgical_year
+from psalter.models import Psalm
+from psalter.repository import clear_psalter
+
+BENCHMARK_SETTINGS = {
+    "CACHES": {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "benchmark",
+            "OPTIONS": {"MAX_ENTRIES": 50000},
+        }
+    },
+    "ALLOWED_HOSTS": ["testserver"],
+    "SCRIPTURE_PROVIDER": {"BACKEND": "lectionary.services.scripture.ESVProvider"},
+}
+START = dt.date(2024, 12, 1)
+DETAIL_DAY = ("First Sunday of Advent", "A")
+
+# Timings which differ from the baseline by less than this are noise
+MIN_DELTA_MS = 1.0
+
+
+@dataclass
+class Case:
+    name: str
+    run: Callable[[], object]
+    # Called before every run, without being timed
+    setup: Callable[[], object] | None = None
+
+
+@dataclass
+class Result:
+    times: list[float]
+    queries: int
+
+    @property
+    def median_ms(self) -> float:
+        return statistics.median(self.times) * 1000
+
+    @property
+    def min_ms(self) -> float:
+        return min(self.times) * 1000
+
+    def as_dict(self) -> dict:
+        return {
+            "median_ms": round(self.median_ms, 3),
+            "min_ms": round(self.min_ms, 3),
+            "queries": self.queries,
+        }
+
+
+class StubESVHandler(BaseHTTPRequestHandler):
+    """Answers like the ESV API's html endpoint, after a delay."""
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        reference = parse_qs(urlparse(self.path).query)["q"][0]
+        body = json.dumps(
+            {
+                "canonical": reference,
+                "passages": [f"<p><b class='verse-num'>1&nbsp;</b>{reference}</p>"],
+            }
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def stub_esv(latency: float):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubESVHandler)
+    server.latency = latency
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_port}/v3/passage/html/"
+    try:
+        with mock.patch.object(scripture, "ESV_HTML_URL", url):
+            yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def fetch(client: Client, url: str):
+    response = client.get(url)
+    if response.status_code != 200:
+        raise RuntimeError(f"{url} returned {response.status_code}")
+    return response
+
+
+def clear_lessons(day: Day):
+    Lesson.objects.filter(day=day).update(html=None, text=None)
+
+
+def get_cases(client: Client) -> list[Case]:
+    cases = []
+
+    for years in (1, 10, 100):
+        end = START + relativedelta(years=years, days=-1)
+        cases.append(
+            Case(
+                f"lectionary_{years}y",
+                partial(Lectionary.resolve_range, START, end),
+                setup=get_liturgical_year.cache_clear,
+            )
+        )
+
+    for label, days in (("4w", 28), ("1y", 365)):
+        end = START + dt.timedelta(days=days - 1)
+        url = f"/?start={START}&end={end}"
+        cases.append(
+            Case(f"index_{label}_cold", partial(fetch, client, url), cache.clear)
+        )
+        cases.append(Case(f"index_{label}_warm", partial(fetch, client, url)))
+
+    name, year = DETAIL_DAY
+    day = Day.objects.filter(name=name, year=year).order_by("pk").first()
+    url = day.get_absolute_url()
+    cases.append(
+        Case("detail_cold", partial(fetch, client, url), partial(clear_lessons, day))
+    )
+    cases.append(Case("detail_warm", partial(fetch, client, url)))
+
+    psalm = Psalm.objects.get(number=119)
+    cases.append(Case("psalm_119", partial(psalm.get_html, "Psalm 119")))
+    cases.append(
+        Case("psalm_119_cold", partial(psalm.get_html, "Psalm 119"), clear_psalter)
+    )
+    return cases
+
+
+def measure(case: Case, repeat: int) -> Result:
+    times = []
+    queries = 0
+    for i in range(repeat + 1):
+        if case.setup is not None:
+            case.setup()
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            case.run()
+            elapsed = time.perf_counter() - start
+        if i:
+            times.append(elapsed)
+        queries = len(context.captured_queries)
+    return Result(times, queries)
+
+
+def run_benchmarks(names=None, repeat: int = 5, esv_latency: float = 0.05, report=None):
+    """Run every case (or only those named), returning a dict of name ->
+    Result. `report` is called with the name and result of each case as
+    soon as it is done.
+    """
+
+    results = {}
+    with (
+        override_settings(**BENCHMARK_SETTINGS),
+        stub_esv(esv_latency),
+        transaction.atomic(),
+    ):
+        cache.clear()
+        scripture.breaker.reset()
+        client = Client()
+        for case in get_cases(client):
+            if names and case.name not in names:
+                continue
+            results[case.name] = measure(case, repeat)
+            if report is not None:
+                report(case.name, results[case.name])
+        transaction.set_rollback(True)
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Return a description of every case which does more queries than in
+    the baseline, or is slower by more than `tolerance` (a fraction).
+    """
+
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result.queries > base["queries"]:
+            regressions.append(
+                f"{name}: {result.queries} queries (baseline {base['queries']})"
+            )
+        limit = max(
+            base["median_ms"] * (1 + tolerance), base["median_ms"] + MIN_DELTA_MS
+        )
+        if result.median_ms > limit:
+            regressions.append(
+                f"{name}: {result.median_ms:.2f}ms (baseline {base['median_ms']:.2f}ms)"
+            )
+    return regressions
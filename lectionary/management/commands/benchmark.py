@@ -0,0 +1,113 @@
+import json
+import platform
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from lectionary.benchmarks import compare, run_benchmarks
+from lectionary.models import Day
+from psalter.models import Psalm
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the hot paths of the site (calendar, index and detail pages, and "
+        "psalm rendering) and count their queries. Nothing is changed: the "
+        "suite runs in a transaction which is rolled back, with its own cache "
+        "and a stub of the ESV API."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "cases", nargs="*", help="Names of the cases to run (default: all)."
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Number of timed runs of each case.",
+        )
+        parser.add_argument(
+            "--esv-latency",
+            type=float,
+            default=0.05,
+            help="Seconds the stub ESV API takes to answer each request.",
+        )
+        parser.add_argument(
+            "--save", metavar="PATH", help="Save the results as a baseline."
+        )
+        parser.add_argument(
+            "--compare",
+            metavar="PATH",
+            help=(
+                "Compare the results with a saved baseline, and fail if any "
+                "case is slower or makes more queries."
+            ),
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.25,
+            help="How much slower than the baseline a case may be (default: 0.25).",
+        )
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat must be positive.")
+        if not (Day.objects.exists() and Psalm.objects.exists()):
+            raise CommandError("Load the lectionary data first.")
+
+        baseline = None
+        if options["compare"]:
+            try:
+                with open(options["compare"]) as f:
+                    baseline = json.load(f)["cases"]
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"Could not read the baseline: {e}")
+
+        self.baseline = baseline or {}
+        self.stdout.write(f"{'case':<20}{'median':>12}{'min':>12}{'queries':>9}")
+        results = run_benchmarks(
+            options["cases"],
+            repeat=options["repeat"],
+            esv_latency=options["esv_latency"],
+            report=self.report,
+        )
+        unknown = set(options["cases"]) - set(results)
+        if unknown:
+            raise CommandError(f"Unknown cases: {', '.join(sorted(unknown))}")
+
+        if options["save"]:
+            with open(options["save"], "w") as f:
+                json.dump(
+                    {
+                        "python": platform.python_version(),
+                        "database": connection.vendor,
+                        "repeat": options["repeat"],
+                        "cases": {
+                            name: result.as_dict() for name, result in results.items()
+                        },
+                    },
+                    f,
+                    indent=2,
+                )
+            self.stdout.write(f"Saved the results to {options['save']}")
+
+        if baseline is not None:
+            regressions = compare(results, baseline, options["tolerance"])
+            if regressions:
+                for regression in regressions:
+                    self.stderr.write(regression)
+                raise CommandError(f"{len(regressions)} regressions from the baseline")
+            self.stdout.write(self.style.SUCCESS("No regressions from the baseline"))
+
+    def report(self, name, result):
+        line = (
+            f"{name:<20}{result.median_ms:>10.2f}ms{result.min_ms:>10.2f}ms"
+            f"{result.queries:>9}"
+        )
+        base = self.baseline.get(name)
+        if base and base["median_ms"]:
+            change = result.median_ms / base["median_ms"] - 1
+            line += f"  {change:+.0%} ({base['queries']} queries)"
+        self.stdout.write(line)
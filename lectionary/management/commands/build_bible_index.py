@@ -0,0 +1,69 @@
+import csv
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from lectionary.services.bible import write_bible_index
+from lectionary.services.scripture import get_bible_path
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the bible index read by the local scripture provider from a "
+        "tab separated file of book, chapter, verse, and text (one verse per "
+        "line, with book names as they appear in lesson references)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="Tab separated file of verses.")
+        parser.add_argument(
+            "--output",
+            help=(
+                "Where to write the index (default: the PATH of the "
+                "SCRIPTURE_PROVIDER setting, or data/bible.idx)."
+            ),
+        )
+        parser.add_argument(
+            "--name", default="", help="Name of the translation, e.g. 'WEB'."
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        output = Path(options["output"] or self.default_output())
+
+        try:
+            with open(options["source"], newline="", encoding="utf-8") as f:
+                rows = [
+                    row
+                    for row in csv.reader(f, delimiter="\t", quoting=csv.QUOTE_NONE)
+                    if row and not row[0].startswith("#")
+                ]
+        except OSError as e:
+            raise CommandError(e)
+
+        for line, row in enumerate(rows, 1):
+            if len(row) != 4 or not (row[1].isdigit() and row[2].isdigit()):
+                raise CommandError(f"Row {line} is not book, chapter, verse, text")
+
+        # Written alongside and then moved into place, so that processes which
+        # have the old index mapped keep reading it until they restart
+        temp = output.with_name(output.name + ".tmp")
+        try:
+            count = write_bible_index(temp, rows, name=options["name"])
+        except ValueError as e:
+            raise CommandError(e)
+        os.replace(temp, output)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {count} verses to {output} ({output.stat().st_size} bytes) "
+                f"in {time.perf_counter() - start:.2f}s"
+            )
+        )
+
+    def default_output(self):
+        config = getattr(settings, "SCRIPTURE_PROVIDER", {})
+        return get_bible_path(config.get("OPTIONS", {}))
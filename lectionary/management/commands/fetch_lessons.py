@@ -0,0 +1,79 @@
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from lectionary.services.jobs import run_jobs
+from lectionary.services.scripture import RateLimiter
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a worker which fetches the lessons queued by pages (when the "
+        "MODE of the LESSON_FETCH setting is 'queue'). Any number of workers "
+        "can run at once. Stops after the current batch on SIGINT or SIGTERM."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=4,
+            help="Number of concurrent requests to the scripture provider.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=25,
+            help="Number of jobs to claim at a time.",
+        )
+        parser.add_argument(
+            "--rate",
+            type=int,
+            default=60,
+            help="Maximum requests per minute (0 for no limit).",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait before looking again when no jobs are due.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Run the jobs which are due, and then stop.",
+        )
+
+    def handle(self, *args, **options):
+        if options["concurrency"] < 1 or options["batch_size"] < 1:
+            raise CommandError("--concurrency and --batch-size must be positive.")
+
+        self.stopping = False
+        if not options["once"]:
+            signal.signal(signal.SIGINT, self.stop)
+            signal.signal(signal.SIGTERM, self.stop)
+
+        limiter = RateLimiter(options["rate"])
+        with ThreadPoolExecutor(
+            max_workers=options["concurrency"], thread_name_prefix="fetch"
+        ) as executor:
+            while not self.stopping:
+                # The worker runs for as long as the site, so connections
+                # are recycled like they would be between requests
+                close_old_connections()
+                counts = run_jobs(executor, limiter, options["batch_size"])
+                if any(counts.values()):
+                    self.stdout.write(
+                        f"Fetched {counts['done']} lessons "
+                        f"({counts['retried']} to retry, {counts['failed']} failed)"
+                    )
+                elif options["once"]:
+                    break
+                else:
+                    time.sleep(options["poll_interval"])
+
+    def stop(self, signum, frame):
+        self.stopping = True
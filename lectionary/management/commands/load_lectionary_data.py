@@ -0,0 +1,62 @@
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from lectionary.models import Collect, Day, DayCollect, DayLesson, Lesson
+from lectionary.services.calendar import deferred_rebuild
+from lectionary.services.loader import load_all
+from psalter.models import Psalm, Verse
+from psalter.repository import clear_psalter
+
+
+class Command(BaseCommand):
+    help = (
+        "Load the days, lessons, collects, and psalter from the JSON files in "
+        "data/ into an empty database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--flush",
+            action="store_true",
+            help=(
+                "Delete the existing lectionary and psalter data first. Any "
+                "cached lesson text is lost."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+
+        # The calendar entries are rebuilt once everything is loaded, and the
+        # data version bumped once it is committed
+        with transaction.atomic(), deferred_rebuild():
+            if Day.objects.exists() or Psalm.objects.exists():
+                if not options["flush"]:
+                    raise CommandError(
+                        "The database already contains lectionary data. "
+                        "Use --flush to replace it."
+                    )
+                for model in (
+                    DayLesson,
+                    DayCollect,
+                    Day,
+                    Lesson,
+                    Collect,
+                    Verse,
+                    Psalm,
+                ):
+                    model.objects.all().delete()
+
+            load_all(apps)
+        clear_psalter()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Loaded {Day.objects.count()} days, {Lesson.objects.count()} "
+                f"lessons, and {Verse.objects.count()} psalm verses in "
+                f"{time.perf_counter() - start:.2f}s"
+            )
+        )
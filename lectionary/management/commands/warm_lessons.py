@@ -0,0 +1,149 @@
+import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from lectionary.models import Day, Lesson
+from lectionary.services.scripture import (
+    ESVRateLimitError,
+    RateLimiter,
+    get_provider,
+)
+from psalter.repository import CONTENT_VERSION as PSALTER_VERSION
+
+MAX_RETRIES = 5
+
+
+class Command(BaseCommand):
+    help = (
+        "Fetch and cache the html and text of every lesson which has not been "
+        "cached yet (or, with --refresh, is out of date). Lessons keep their "
+        "old content until the new content has been fetched. Progress is saved "
+        "after each batch, so an interrupted run can simply be started again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--years",
+            default="A,B,C",
+            help="Comma separated lectionary years to warm (default: A,B,C).",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=4,
+            help="Number of concurrent requests to the ESV API.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=25,
+            help="Number of lessons to save at a time.",
+        )
+        parser.add_argument(
+            "--rate",
+            type=int,
+            default=60,
+            help="Maximum ESV API requests per minute (0 for no limit).",
+        )
+        parser.add_argument(
+            "--refresh",
+            action="store_true",
+            help=(
+                "Also fetch again every lesson whose content is out of date "
+                "with the scripture provider or psalter."
+            ),
+        )
+        parser.add_argument(
+            "--max-age",
+            type=int,
+            help="Also fetch again every lesson fetched more than this many days ago.",
+        )
+
+    def handle(self, *args, **options):
+        years = [y.strip().upper() for y in options["years"].split(",") if y.strip()]
+        invalid = set(years) - set(Day.Year.values)
+        if invalid:
+            raise CommandError(f"Unknown years: {', '.join(sorted(invalid))}")
+        if options["concurrency"] < 1 or options["batch_size"] < 1:
+            raise CommandError("--concurrency and --batch-size must be positive.")
+
+        stale = Q(html__isnull=True) | Q(html="") | Q(text__isnull=True) | Q(text="")
+        if options["refresh"]:
+            versions = [PSALTER_VERSION, get_provider().content_version]
+            stale |= ~Q(content_version__in=versions)
+        if options["max_age"] is not None:
+            cutoff = timezone.now() - dt.timedelta(days=options["max_age"])
+            stale |= Q(fetched_at__isnull=True) | Q(fetched_at__lt=cutoff)
+        lessons = Lesson.objects.filter(day__year__in=years)
+        # Content from another provider is fetched again, refresh or not
+        pks = list(
+            (lessons.filter(stale) | lessons.from_other_sources())
+            .distinct()
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        if not pks:
+            self.stdout.write("Every lesson is already cached and up to date.")
+            return
+
+        self.limiter = RateLimiter(options["rate"])
+        batch_size = options["batch_size"]
+        warmed = 0
+        failed = 0
+
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            for i in range(0, len(pks), batch_size):
+                lessons = list(Lesson.objects.filter(pk__in=pks[i : i + batch_size]))
+
+                # Psalms are rendered locally (and need the database), so only
+                # the ESV lessons are handed to the thread pool.
+                esv_lessons = [lesson for lesson in lessons if not lesson.is_psalm]
+                results = executor.map(self.fetch, esv_lessons)
+                passages = dict(zip([lesson.pk for lesson in esv_lessons], results))
+
+                fetched = []
+                for lesson in lessons:
+                    if lesson.pk in passages:
+                        passage = passages[lesson.pk]
+                    else:
+                        passage = self.render_psalm(lesson)
+
+                    # Lessons which could not be fetched keep what they had
+                    if isinstance(passage, Exception):
+                        self.stderr.write(f"Could not fetch {lesson}: {passage}")
+                    elif all(passage):
+                        lesson.set_content(*passage)
+                        fetched.append(lesson)
+                Lesson.objects.bulk_update(fetched, Lesson.CONTENT_FIELDS)
+
+                warmed += len(fetched)
+                failed += len(lessons) - len(fetched)
+                self.stdout.write(f"Cached {warmed}/{len(pks)} lessons")
+
+        if failed:
+            self.stdout.write(
+                self.style.WARNING(f"{failed} lessons could not be cached")
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Cached {warmed} lessons"))
+
+    def render_psalm(self, lesson):
+        try:
+            return lesson.get_psalm_passage()
+        except Exception as e:
+            return e
+
+    def fetch(self, lesson):
+        for attempt in range(MAX_RETRIES):
+            self.limiter.wait()
+            try:
+                return get_provider().get_passage(lesson.reference)
+            except ESVRateLimitError as e:
+                if attempt == MAX_RETRIES - 1:
+                    return e
+                self.limiter.pause(e.retry_after)
+            except Exception as e:
+                return e
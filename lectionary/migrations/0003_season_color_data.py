@@ -1,21 +1,12 @@
 # Generated by Django 5.0.7 on 2024-08-08 14:34
 
-import json
 from django.db import migrations
 
+from lectionary.services.loader import load_seasons
 
-def season_color_data(apps, _):
-    Day = apps.get_model("lectionary", "Day")
-
-    with open("data/seasons.json") as f:
-        data = json.load(f)
 
-    for key, val in data.items():
-        days = Day.objects.filter(name=key)
-        for day in days:
-            day.season = val["season"]
-            day.color = val["color"]
-            day.save()
+def season_color_data(apps, _):
+    load_seasons(apps)
 
 
 class Migration(migrations.Migration):
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.7 on 2026-10-18 13:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lectionary', '0005_collect_data'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='daycollect',
+            name='day',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='lectionary.day'),
+        ),
+        migrations.AlterField(
+            model_name='daylesson',
+            name='day',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='lectionary.day'),
+        ),
+        migrations.AddIndex(
+            model_name='day',
+            index=models.Index(fields=['name', 'year'], name='day_name_year_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='daycollect',
+            constraint=models.UniqueConstraint(fields=('day', 'collect'), name='unique_day_collect'),
+        ),
+        migrations.AddConstraint(
+            model_name='daylesson',
+            constraint=models.UniqueConstraint(fields=('day', 'lesson'), name='unique_day_lesson'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-18 13:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lectionary', '0006_alter_daycollect_day_alter_daylesson_day_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='content_version',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='fetched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.7 on 2026-10-18 13:36
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lectionary', '0007_lesson_content_version_lesson_fetched_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FetchJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run_after', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('lesson', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='fetch_job', to='lectionary.lesson')),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.7 on 2026-10-18 13:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lectionary', '0008_fetchjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalendarEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=256)),
+                ('year', models.CharField(max_length=16)),
+                ('service', models.CharField(blank=True, max_length=256, null=True)),
+                ('data', models.JSONField()),
+                ('day', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='calendar_entry', to='lectionary.day')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['name', 'year'], name='calendar_entry_name_year_idx')],
+            },
+        ),
+    ]
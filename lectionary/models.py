@@ -1,10 +1,26 @@
-from django.db import models
+import datetime as dt
+import logging
+from collections import Counter, defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, models, transaction
+from django.db.models import Q, Value
+from django.db.models.functions import Left, StrIndex
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
+from django.utils import timezone
 
-from lectionary.services.scripture import get_esv_html, get_esv_text
+from lectionary.services.reference import parse_lesson
+from lectionary.services.scripture import ScriptureError, get_provider
 from psalter.models import Psalm
-from psalter.services import parse_psalm_num
+from psalter.repository import CONTENT_VERSION as PSALTER_VERSION
+from website import metrics, timing
+
+logger = logging.getLogger("django")
+
+# Where the content of lessons cached without a content version came from
+LEGACY_SOURCE = "esv"
 
 
 class Day(models.Model):
@@ -42,6 +58,9 @@ class Day(models.Model):
     lessons = models.ManyToManyField("Lesson", through="DayLesson")
     collects = models.ManyToManyField("Collect", through="DayCollect")
 
+    class Meta:
+        indexes = [models.Index(fields=["name", "year"], name="day_name_year_idx")]
+
     def __str__(self):
         if self.service is not None:
             return f"{self.name}: {self.service} ({self.year})"
@@ -51,65 +70,301 @@ class Day(models.Model):
         return reverse("detail", kwargs={"pk": self.pk})
 
 
+def get_fetch_options() -> dict:
+    """Lessons which have not been cached yet are either fetched while the
+    page waits ("inline"), or queued for the fetch_lessons worker ("queue")
+    and filled in by the page, which polls for them every POLL_INTERVAL
+    seconds:
+
+        LESSON_FETCH = {"MODE": "queue", "POLL_INTERVAL": 2}
+    """
+
+    return {
+        "MODE": "inline",
+        "POLL_INTERVAL": 2,
+        **getattr(settings, "LESSON_FETCH", {}),
+    }
+
+
+def is_queued() -> bool:
+    return get_fetch_options()["MODE"] == "queue"
+
+
+def record_lesson_hits(lessons):
+    """Count which of the lessons about to be served were already cached."""
+
+    counts = Counter()
+    for lesson in lessons:
+        source = "psalm" if lesson.is_psalm else get_provider().name
+        result = "hit" if lesson.is_cached else "miss"
+        counts[source, result] += 1
+    for (source, result), n in counts.items():
+        timing.count(f"lesson_{result}", n)
+        metrics.LESSON_CACHE.labels(source, result).inc(n)
+
+
+def get_content_source(content_version: str) -> str:
+    """Return where content came from (e.g. "esv") given its version."""
+
+    return content_version.partition(":")[0]
+
+
+class LessonQuerySet(models.QuerySet):
+    def invalidate(self):
+        """Mark the cached content of these lessons as stale, so that it is
+        refreshed by `warm_lessons --refresh`. It is still served until then.
+        """
+
+        # Only the source is kept, e.g. "esv:"
+        source = Left("content_version", StrIndex("content_version", Value(":")))
+        return self.update(content_version=source)
+
+    def from_other_sources(self):
+        """Return the lessons whose content came from somewhere other than
+        where it would come from now, which are treated as not cached.
+        """
+
+        sources = {get_content_source(PSALTER_VERSION), get_provider().name}
+        current = Q()
+        for source in sources:
+            current |= Q(content_version__startswith=f"{source}:")
+        if LEGACY_SOURCE in sources:
+            current |= Q(content_version="")
+        return self.exclude(current)
+
+
 class Lesson(models.Model):
     """A model representing a specific lesson appointed in the
     lectionary for one or more holy days. Note that the scripture
     field may have alternate readings separated by " or ".
+
+    The html and text are cached along with the content version of
+    wherever they came from, and when they were fetched. Content which is
+    out of date is served as it is until it has been fetched again (except
+    for psalms, which are rendered locally and cheaply re-rendered).
     """
 
+    # Fields saved whenever the content of a lesson is fetched or refreshed
+    CONTENT_FIELDS = ["html", "text", "content_version", "fetched_at"]
+
     reference = models.CharField(max_length=256)
     html = models.TextField(null=True, blank=True)
     text = models.TextField(null=True, blank=True)
+    content_version = models.CharField(max_length=64, blank=True, default="")
+    fetched_at = models.DateTimeField(null=True, blank=True)
+
+    objects = LessonQuerySet.as_manager()
+
+    @property
+    def is_psalm(self):
+        try:
+            return parse_lesson(self.reference)[0].is_psalm
+        except ValueError:
+            return self.reference.startswith("Psalm")
+
+    @property
+    def is_cached(self):
+        """Whether there is content to serve, which came from where it
+        would come from now. Passages fetched from another scripture
+        provider are fetched again, rather than served under the current
+        provider's copyright.
+        """
+
+        if not (self.html and self.text):
+            return False
+        return self.get_content_source() == get_content_source(
+            self.get_content_version()
+        )
+
+    def get_content_source(self):
+        if not self.content_version:
+            return (
+                get_content_source(PSALTER_VERSION) if self.is_psalm else LEGACY_SOURCE
+            )
+        return get_content_source(self.content_version)
+
+    def get_content_version(self):
+        if self.is_psalm:
+            return PSALTER_VERSION
+        return get_provider().content_version
+
+    def is_stale(self, max_age=None):
+        """Whether the content of this lesson is missing, or out of date
+        with its source, or (given a timedelta) older than `max_age`.
+        """
+
+        if not self.is_cached or self.content_version != self.get_content_version():
+            return True
+        if max_age is None:
+            return False
+        return self.fetched_at is None or self.fetched_at < timezone.now() - max_age
+
+    def set_content(self, html, text):
+        self.html = html
+        self.text = text
+        self.content_version = self.get_content_version()
+        self.fetched_at = timezone.now()
 
     def get_html(self):
-        if self.reference.startswith("Psalm"):
+        if self.is_psalm:
             self.psalm_cache()
         else:
-            self.esv_cache()
+            self.scripture_cache()
         return self.html
 
     def get_text(self):
-        if self.reference.startswith("Psalm"):
+        if self.is_psalm:
             self.psalm_cache()
         else:
-            self.esv_cache()
+            self.scripture_cache()
         return self.text
 
     def psalm_cache(self):
-        if self.html and self.text:
+        if not self.is_stale():
+            return
+
+        try:
+            passage = self.get_psalm_passage()
+        except ValueError as e:
+            logger.warning(f"Could not render {self.reference}: {e}")
             return
+        self.set_content(*passage)
+        self.save(update_fields=self.CONTENT_FIELDS)
 
-        psalm_num = parse_psalm_num(self.reference)
-        psalm = get_object_or_404(Psalm, number=psalm_num)
-        self.html = psalm.get_html(self.reference)
-        self.text = psalm.get_text(self.reference)
-        self.save()
+    def get_psalm_passage(self):
+        reference = parse_lesson(self.reference)[0]
+        psalm = get_object_or_404(Psalm, number=reference.chapter)
+        return psalm.get_html(reference.raw), psalm.get_text(reference.raw)
 
-    def esv_cache(self):
-        if self.html and self.text:
+    def scripture_cache(self):
+        if self.is_cached:
             return
 
-        self.html = get_esv_html(self.reference)
-        self.text = get_esv_text(self.reference)
-        self.save()
+        try:
+            html, text = get_provider().get_passage(self.reference)
+        except ScriptureError as e:
+            logger.warning(f"Could not fetch {self.reference}: {e}")
+            return
+        self.set_content(html, text)
+        self.save(update_fields=self.CONTENT_FIELDS)
+
+    @classmethod
+    async def acache_all(cls, lessons):
+        """Fill the cache of every given lesson, fetching any missing
+        passages from the scripture provider all at once rather than one
+        after another.
+        """
+
+        record_lesson_hits(lessons)
+        missing = [
+            lesson for lesson in lessons if not lesson.is_psalm and not lesson.is_cached
+        ]
+        if is_queued():
+            await FetchJob.aenqueue(cls.get_queued(lessons))
+        elif missing:
+            passages = await get_provider().aget_passages(
+                {lesson.reference for lesson in missing}
+            )
+            fetched = [lesson for lesson in missing if lesson.reference in passages]
+            for lesson in fetched:
+                lesson.set_content(*passages[lesson.reference])
+            await cls.objects.abulk_update(fetched, cls.CONTENT_FIELDS)
+
+        # Psalms are rendered locally, but may need the psalter loaded first
+        if any(lesson.is_psalm and lesson.is_stale() for lesson in lessons):
+            await sync_to_async(cls.psalm_cache_all)(lessons)
+
+    @staticmethod
+    def get_queued(lessons):
+        """Return the lessons to queue for the worker: those not cached yet,
+        and those out of date, which are served as they are until then.
+        """
 
-    def clear_cache(self):
-        self.html = None
-        self.text = None
-        self.save()
+        return [
+            lesson for lesson in lessons if not lesson.is_psalm and lesson.is_stale()
+        ]
+
+    @classmethod
+    def psalm_cache_all(cls, lessons):
+        for lesson in lessons:
+            if lesson.is_psalm:
+                lesson.psalm_cache()
 
     def __str__(self):
         return f"{self.reference}"
 
 
+class FetchJobQuerySet(models.QuerySet):
+    def claim(self, limit: int, lease: dt.timedelta):
+        """Claim up to `limit` jobs which are due, returning them with their
+        lessons. Claimed jobs are not due again until the lease is over, so
+        those of a worker which dies are picked up by another one, and
+        workers skip past each other's locked rows rather than waiting.
+        """
+
+        now = timezone.now()
+        with transaction.atomic():
+            jobs = list(
+                self.select_for_update(skip_locked=True, of=("self",))
+                .select_related("lesson")
+                .filter(run_after__lte=now)
+                .order_by("run_after")[:limit]
+            )
+            for job in jobs:
+                job.attempts += 1
+                job.run_after = now + lease
+            self.bulk_update(jobs, ["attempts", "run_after"])
+        return jobs
+
+
+class FetchJob(models.Model):
+    """A lesson queued to be fetched from the scripture provider by the
+    fetch_lessons worker, outside of any request. A lesson has at most one
+    job, which is deleted once it is done (or has failed too many times).
+    """
+
+    lesson = models.OneToOneField(
+        "Lesson", on_delete=models.CASCADE, related_name="fetch_job"
+    )
+    run_after = models.DateTimeField(default=timezone.now, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = FetchJobQuerySet.as_manager()
+
+    @classmethod
+    def enqueue(cls, lessons):
+        """Queue a job for each of the lessons, unless it already has one."""
+
+        if lessons:
+            jobs = [cls(lesson=lesson) for lesson in lessons]
+            cls.objects.bulk_create(jobs, ignore_conflicts=True)
+
+    @classmethod
+    async def aenqueue(cls, lessons):
+        if lessons:
+            jobs = [cls(lesson=lesson) for lesson in lessons]
+            await cls.objects.abulk_create(jobs, ignore_conflicts=True)
+
+    def __str__(self):
+        return f"{self.lesson} (attempt {self.attempts})"
+
+
 class DayLesson(models.Model):
     """A model representing the many-to-many relationship between
     Days and Lessons.
     """
 
-    day = models.ForeignKey("Day", on_delete=models.CASCADE)
+    # Lookups by day use the leading column of the unique index below
+    day = models.ForeignKey("Day", on_delete=models.CASCADE, db_index=False)
     lesson = models.ForeignKey("Lesson", on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "lesson"], name="unique_day_lesson")
+        ]
+
 
 class Collect(models.Model):
     """A model representing the collect appointed for a given day
@@ -123,5 +378,100 @@ class DayCollect(models.Model):
     """A model representing the many-to-many relationship between
     Days and Collects."""
 
-    day = models.ForeignKey("Day", on_delete=models.CASCADE)
+    # Lookups by day use the leading column of the unique index below
+    day = models.ForeignKey("Day", on_delete=models.CASCADE, db_index=False)
     collect = models.ForeignKey("Collect", on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "collect"], name="unique_day_collect"
+            )
+        ]
+
+
+class CalendarEntry(models.Model):
+    """A read model of the calendar: one row per Day, with everything the
+    calendar shows of it (and its collects) joined and serialized ahead of
+    time, so that the entries for a range of dates take a single indexed
+    read. The season is not included, since it is that of the date rather
+    than the day.
+
+    Entries are rebuilt from the days after every migration and whenever
+    the data is loaded, and a day's entry once a change to the day, its
+    lessons or its collects is committed (see services/calendar.py).
+    """
+
+    day = models.OneToOneField(
+        "Day", on_delete=models.CASCADE, related_name="calendar_entry"
+    )
+    name = models.CharField(max_length=256)
+    year = models.CharField(max_length=16)
+    service = models.CharField(max_length=256, null=True, blank=True)
+    # {"day": {"name", "service", "color", "url"}, "lessons": [...],
+    #  "collects": [...]}
+    data = models.JSONField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["name", "year"], name="calendar_entry_name_year_idx")
+        ]
+
+    @classmethod
+    def rebuild(cls, day_ids=None, using=DEFAULT_DB_ALIAS):
+        """Rebuild the entries of the given days (or of every day), returning
+        the number of entries built.
+        """
+
+        days = Day.objects.using(using).order_by("pk")
+        if day_ids is not None:
+            days = days.filter(pk__in=day_ids)
+        rows = list(days.values_list("pk", "name", "year", "service", "color"))
+        pks = [row[0] for row in rows]
+
+        lessons = defaultdict(list)
+        for day_id, reference in (
+            DayLesson.objects.using(using)
+            .filter(day_id__in=pks)
+            .order_by("pk")
+            .values_list("day_id", "lesson__reference")
+        ):
+            lessons[day_id].append(reference)
+        collects = defaultdict(list)
+        for day_id, text in (
+            DayCollect.objects.using(using)
+            .filter(day_id__in=pks)
+            .order_by("pk")
+            .values_list("day_id", "collect__text")
+        ):
+            collects[day_id].append(text)
+
+        entries = [
+            cls(
+                day_id=pk,
+                name=name,
+                year=year,
+                service=service,
+                data={
+                    "day": {
+                        "name": name,
+                        "service": service,
+                        "color": color,
+                        "url": reverse("detail", kwargs={"pk": pk}),
+                    },
+                    "lessons": lessons[pk],
+                    "collects": collects[pk],
+                },
+            )
+            for pk, name, year, service, color in rows
+        ]
+        with transaction.atomic(using=using):
+            stale = cls.objects.using(using)
+            if day_ids is not None:
+                stale = stale.filter(day_id__in=day_ids)
+            stale.delete()
+            cls.objects.using(using).bulk_create(entries, batch_size=1000)
+        return len(entries)
+
+    def __str__(self):
+        return f"{self.day}"
@@ -0,0 +1,185 @@
+"""A compact on-disk index of a whole bible, read through mmap.
+
+The file holds a small JSON index followed by three flat tables, with one
+entry per verse in (book, chapter, verse) order:
+
+    header      magic, size of the JSON index, number of verses
+    index       {"name": ..., "checksum": ..., "books": {book: [first row
+                of each chapter, ..., end row]}}
+    numbers     uint16 verse number of each row
+    offsets     uint32 offset of each row's text (plus one for the end)
+    text        utf-8 text of every verse, back to back
+
+A verse is found by bisecting the rows of its chapter, and since rows are
+in order, a range of verses (even across chapters) is a run of rows. Only
+the index is parsed when the file is opened; the tables stay on disk and
+are paged in by the OS as they are read.
+"""
+
+import hashlib
+import json
+import mmap
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from html import escape
+
+from lectionary.services.reference import Reference, parse_lesson
+
+MAGIC = b"LECTBIB1"
+HEADER = struct.Struct("<8sII")
+
+
+def _align(position: int) -> int:
+    return (position + 3) & ~3
+
+
+def _table(buffer: memoryview, typecode: str):
+    """Return a zero-copy view of a little-endian table."""
+
+    view = buffer.cast(typecode)
+    if sys.byteorder == "little":
+        return view
+    table = array(typecode, view)
+    table.byteswap()
+    return table
+
+
+def write_bible_index(path, rows, name: str = "") -> int:
+    """Write (book, chapter, verse, text) rows to a bible index at `path`,
+    returning the number of verses written. Books are kept in the order in
+    which they first appear, and chapters and verses are sorted.
+    """
+
+    books = {}
+    for book, chapter, verse, text in rows:
+        chapters = books.setdefault(book, {})
+        verses = chapters.setdefault(int(chapter), {})
+        if int(verse) in verses:
+            raise ValueError(f"{book} {chapter}:{verse} appears more than once")
+        verses[int(verse)] = text.strip()
+
+    numbers = array("H")
+    offsets = array("I", [0])
+    text = bytearray()
+    index = {}
+    for book, chapters in books.items():
+        starts = index[book] = []
+        for chapter in range(1, max(chapters) + 1):
+            starts.append(len(numbers))
+            for verse, verse_text in sorted(chapters.get(chapter, {}).items()):
+                numbers.append(verse)
+                text += verse_text.encode()
+                offsets.append(len(text))
+        starts.append(len(numbers))
+
+    if sys.byteorder != "little":
+        numbers.byteswap()
+        offsets.byteswap()
+
+    checksum = hashlib.sha256(numbers.tobytes() + text).hexdigest()[:16]
+    encoded = json.dumps({"name": name, "checksum": checksum, "books": index})
+    encoded = encoded.encode()
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(encoded), len(numbers)))
+        f.write(encoded)
+        f.write(b"\0" * (_align(f.tell()) - f.tell()))
+        f.write(numbers.tobytes())
+        f.write(b"\0" * (_align(f.tell()) - f.tell()))
+        f.write(offsets.tobytes())
+        f.write(text)
+    return len(numbers)
+
+
+class BibleIndex:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_size, count = HEADER.unpack_from(self.mmap)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a bible index")
+
+        position = HEADER.size + index_size
+        index = json.loads(self.mmap[HEADER.size : position])
+        self.name = index["name"]
+        # Changes along with the text of the index
+        self.checksum = index.get("checksum", "")
+        self.books = index["books"]
+
+        view = memoryview(self.mmap)
+        position = _align(position)
+        self.numbers = _table(view[position : position + 2 * count], "H")
+        position = _align(position + 2 * count)
+        self.offsets = _table(view[position : position + 4 * (count + 1)], "I")
+        self.text_start = position + 4 * (count + 1)
+
+    def __len__(self) -> int:
+        return len(self.numbers)
+
+    def _bounds(self, book: str, chapter: int | None) -> tuple[int, int]:
+        starts = self.books.get(book)
+        if starts is None or chapter is None or not 0 < chapter < len(starts):
+            raise KeyError((book, chapter))
+        return starts[chapter - 1], starts[chapter]
+
+    def first_row(self, book: str, chapter: int, verse: int) -> int:
+        """Return the row of the first verse at or after `verse`."""
+
+        lo, hi = self._bounds(book, chapter)
+        return bisect_left(self.numbers, verse, lo, hi)
+
+    def last_row(self, book: str, chapter: int, verse: int) -> int:
+        """Return the row of the last verse at or before `verse`."""
+
+        lo, hi = self._bounds(book, chapter)
+        return bisect_right(self.numbers, verse, lo, hi) - 1
+
+    def verse_text(self, row: int) -> str:
+        start = self.text_start + self.offsets[row]
+        end = self.text_start + self.offsets[row + 1]
+        return self.mmap[start:end].decode()
+
+    def passage_rows(self, reference: Reference) -> list[range]:
+        if not reference.ranges:
+            return [range(*self._bounds(reference.book, reference.chapter))]
+        rows = []
+        for r in reference.ranges:
+            first = self.first_row(reference.book, r.start_chapter, r.start_verse)
+            last = self.last_row(reference.book, r.end_chapter, r.end_verse)
+            if first <= last:
+                rows.append(range(first, last + 1))
+        return rows
+
+    def render(self, lesson: str) -> tuple[str, str]:
+        """Return the html and plain text of every reading of a lesson, in
+        the same shape as passages from the ESV API: a paragraph for each
+        range of verses, with chapter and verse numbers.
+        """
+
+        html = []
+        text = []
+        for reference in parse_lesson(lesson):
+            starts = self.books.get(reference.book, ())
+            for rows in self.passage_rows(reference):
+                chapter = bisect_right(starts, rows.start)
+                verses_html = []
+                verses_text = []
+                for row in rows:
+                    while row == starts[chapter]:
+                        chapter += 1
+                    number = self.numbers[row]
+                    verse = self.verse_text(row)
+                    if number == 1:
+                        label = f"{chapter}:{number}"
+                        css_class = "chapter-num"
+                    else:
+                        label = str(number)
+                        css_class = "verse-num"
+                    verses_html.append(
+                        f"<b class='{css_class}'>{label}&nbsp;</b>{escape(verse)}"
+                    )
+                    verses_text.append(f"{label} {verse}")
+                html.append(f"<p>{' '.join(verses_html)}</p>")
+                text.append(" ".join(verses_text))
+        return "\n".join(html), "\n\n".join(text)
@@ -0,0 +1,260 @@
+import datetime as dt
+import time
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+
+from lectionary.models import CalendarEntry, DayCollect, DayLesson
+from lectionary.services.lectionary import Lectionary
+from website import metrics, timing
+
+DATA_VERSION_KEY = "lectionary:data-version"
+CALENDAR_TIMEOUT = 60 * 60 * 24 * 30
+CHUNK_DAYS = 366
+STORE_MAX_DAYS = 366
+
+# Set while bulk changes are made, which rebuild every entry at the end
+rebuild_deferred = ContextVar("rebuild_deferred", default=False)
+
+
+def get_data_version() -> int:
+    """Return a token which changes whenever the lectionary data does: the
+    time, in nanoseconds, at which it was last changed (or first asked for).
+    It is kept in the cache so that every worker sees the same value.
+    """
+
+    return cache.get_or_set(DATA_VERSION_KEY, time.time_ns, timeout=None)
+
+
+def bump_data_version(**kwargs):
+    cache.set(DATA_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def calendar_key(date: dt.date, version: int) -> str:
+    return f"calendar:{version}:{date.isoformat()}"
+
+
+def rebuild_calendar_entries(using=DEFAULT_DB_ALIAS, **kwargs):
+    """Rebuild every CalendarEntry after migrations, which may have changed
+    the data (unless they were rolled back to before the table existed).
+    """
+
+    if (
+        CalendarEntry._meta.db_table
+        not in connections[using].introspection.table_names()
+    ):
+        return
+    CalendarEntry.rebuild(using=using)
+    try:
+        with transaction.atomic(using=using):
+            bump_data_version()
+    except DatabaseError:
+        # The table of a DatabaseCache only exists once createcachetable has
+        # been run, and until then nothing can have been cached anyway
+        pass
+
+
+def rebuild_entries(day_ids):
+    CalendarEntry.rebuild(list(day_ids))
+    bump_data_version()
+
+
+def schedule_rebuild(day_ids):
+    """Rebuild the entries of the given days, and then bump the data
+    version, once the current transaction (if any) has committed. Until
+    then requests still see the old data, which they may cache under the
+    old version, but never under the new one.
+    """
+
+    if not rebuild_deferred.get():
+        transaction.on_commit(partial(rebuild_entries, day_ids))
+
+
+@contextmanager
+def deferred_rebuild():
+    """Skip rebuilding entries for each change made in the block, and
+    rebuild every entry once at the end instead, for bulk changes like
+    loading the data.
+    """
+
+    token = rebuild_deferred.set(True)
+    try:
+        yield
+    finally:
+        rebuild_deferred.reset(token)
+    CalendarEntry.rebuild()
+    transaction.on_commit(bump_data_version)
+
+
+# The calendar shows the days, their lessons and their collects (through
+# CalendarEntry), so a change to any of them rebuilds the entries of the
+# days it belongs to.
+
+
+def day_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_rebuild([instance.pk])
+
+
+def day_link_changed(sender, instance, raw=False, **kwargs):
+    """Called when a DayLesson or DayCollect is saved or deleted."""
+
+    if not raw:
+        schedule_rebuild([instance.day_id])
+
+
+def lesson_changed(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Lessons are saved all the time as their passages are cached, which
+    # changes nothing the calendar shows
+    if raw or (update_fields is not None and "reference" not in update_fields):
+        return
+    days = DayLesson.objects.filter(lesson_id=instance.pk)
+    schedule_rebuild(days.values_list("day_id", flat=True))
+
+
+def collect_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        days = DayCollect.objects.filter(collect_id=instance.pk)
+        schedule_rebuild(days.values_list("day_id", flat=True))
+
+
+def get_days(pairs: set[tuple[str, str]]) -> dict[tuple[str, str], list[dict]]:
+    """Load the calendar entry of every Day matching one of the given
+    (name, year) pairs, with its lesson references. This takes a single
+    query regardless of how many pairs are given.
+    """
+
+    if not pairs:
+        return {}
+
+    names = {name for name, _ in pairs}
+    years = {year for _, year in pairs}
+    rows = (
+        CalendarEntry.objects.filter(name__in=names, year__in=years)
+        .order_by("day_id")
+        .values_list("name", "year", "data")
+    )
+
+    days = defaultdict(list)
+    for name, year, data in rows:
+        if (name, year) in pairs:
+            days[(name, year)].append(data)
+
+    return days
+
+
+def build_fragments(dates: list[dt.date]) -> dict[dt.date, list[dict]]:
+    """Build the calendar entries for each of the given dates. Entries are
+    plain dicts so that they can be cached.
+    """
+
+    wanted = set(dates)
+    with timing.timed("lectionary"):
+        liturgical_days = [
+            ld
+            for ld in Lectionary.resolve_range(min(dates), max(dates))
+            if ld.date in wanted
+        ]
+    days = get_days({(name, ld.year) for ld in liturgical_days for name in ld.names})
+
+    fragments = {}
+    for liturgical_day in liturgical_days:
+        entries = []
+        for name in liturgical_day.names:
+            for day in days.get((name, liturgical_day.year), []):
+                entries.append(
+                    {
+                        "day": day["day"],
+                        "year": liturgical_day.year,
+                        "season": liturgical_day.season,
+                        "lessons": day["lessons"],
+                    }
+                )
+        fragments[liturgical_day.date] = entries
+
+    return fragments
+
+
+def get_fragments(
+    dates: list[dt.date], store: bool = True
+) -> dict[dt.date, list[dict]]:
+    """Return the cached fragment of each date, building (and, if store is
+    set, caching) only the fragments which are missing.
+    """
+
+    version = get_data_version()
+    keys = {date: calendar_key(date, version) for date in dates}
+
+    cached = cache.get_many(keys.values())
+    fragments = {date: cached[key] for date, key in keys.items() if key in cached}
+
+    missing = [date for date in dates if date not in fragments]
+    timing.count("calendar_hit", len(fragments))
+    timing.count("calendar_miss", len(missing))
+    metrics.CALENDAR_CACHE.labels("hit").inc(len(fragments))
+    metrics.CALENDAR_CACHE.labels("miss").inc(len(missing))
+    if missing:
+        built = build_fragments(missing)
+        if store:
+            cache.set_many(
+                {keys[date]: entries for date, entries in built.items()},
+                timeout=CALENDAR_TIMEOUT,
+            )
+        fragments.update(built)
+
+    return fragments
+
+
+def date_range(start: dt.date, end: dt.date) -> list[dt.date]:
+    return [start + dt.timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def build_calendar(start: dt.date, end: dt.date) -> dict[str, list[dict]]:
+    """Assemble the calendar for a range of dates from the fragment of each
+    date. As with iter_calendar, fragments built for ranges longer than
+    STORE_MAX_DAYS are not cached.
+    """
+
+    if end < start:
+        return {}
+
+    dates = date_range(start, end)
+    fragments = get_fragments(dates, store=(end - start).days < STORE_MAX_DAYS)
+
+    calendar = {}
+    for date in dates:
+        # Leave out all dates which have no lectionary data
+        if fragments[date]:
+            calendar[date.strftime("%A, %D")] = fragments[date]
+
+    return calendar
+
+
+def iter_calendar(
+    start: dt.date, end: dt.date, chunk_days: int = CHUNK_DAYS
+) -> Iterator[tuple[dt.date, list[dict]]]:
+    """Yield the (date, entries) of every date in a range which has any
+    lectionary data, loading only a chunk of dates at a time so that long
+    ranges take the same memory as short ones.
+
+    Fragments built for ranges longer than STORE_MAX_DAYS are not cached,
+    so that bulk exports do not push the dates people actually look at
+    out of the cache.
+    """
+
+    store = (end - start).days < STORE_MAX_DAYS
+    # Chunks are counted in ordinals, which (unlike dates) can step past
+    # date.max at the end of the range
+    last = end.toordinal()
+    for first in range(start.toordinal(), last + 1, chunk_days):
+        chunk_end = dt.date.fromordinal(min(first + chunk_days - 1, last))
+        dates = date_range(dt.date.fromordinal(first), chunk_end)
+        fragments = get_fragments(dates, store=store)
+        for date in dates:
+            if fragments[date]:
+                yield date, fragments[date]
@@ -0,0 +1,69 @@
+import datetime as dt
+import hashlib
+from functools import lru_cache
+
+from django.template.loader import get_template
+from django.utils.http import quote_etag
+
+from lectionary.services.calendar import get_data_version
+
+INDEX_TEMPLATES = ("lectionary/index.html", "lectionary/base.html")
+DETAIL_TEMPLATES = ("lectionary/detail.html", "lectionary/base.html")
+
+
+def make_etag(*parts) -> str:
+    """Return a strong ETag which changes whenever any of the parts do."""
+
+    digest = hashlib.sha256("\0".join(str(part) for part in parts).encode())
+    return quote_etag(digest.hexdigest()[:32])
+
+
+@lru_cache(maxsize=None)
+def get_template_version(names: tuple[str, ...]) -> str:
+    """Return a hash of the given templates, so that a deploy which changes
+    them also changes every ETag of the pages they render.
+    """
+
+    digest = hashlib.sha256()
+    for name in names:
+        digest.update(get_template(name).template.source.encode())
+    return digest.hexdigest()[:16]
+
+
+def get_index_etag(start: dt.date, end: dt.date) -> str:
+    return make_etag(
+        "index",
+        start.isoformat(),
+        end.isoformat(),
+        get_data_version(),
+        get_template_version(INDEX_TEMPLATES),
+    )
+
+
+def get_api_calendar_etag(start: dt.date, end: dt.date) -> str:
+    return make_etag("api-v1", start.isoformat(), end.isoformat(), get_data_version())
+
+
+def get_ics_etag(start_year: int, end_year: int, base_url: str) -> str:
+    return make_etag("ics", start_year, end_year, base_url, get_data_version())
+
+
+def get_detail_etag(day, lessons) -> str | None:
+    """Return the ETag of a day's page, or None if any of its lessons has
+    not been cached yet (since the page is bound to change once it is).
+    """
+
+    digest = hashlib.sha256()
+    for lesson in lessons:
+        if not lesson.is_cached:
+            return None
+        digest.update(lesson.html.encode())
+        digest.update(lesson.text.encode())
+
+    return make_etag(
+        "detail",
+        day.pk,
+        digest.hexdigest(),
+        get_data_version(),
+        get_template_version(DETAIL_TEMPLATES),
+    )
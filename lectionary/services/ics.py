@@ -0,0 +1,128 @@
+"""iCalendar (RFC 5545) export of the lectionary.
+
+The feed is made of one block of VEVENTs per civil year. Each block is
+cached as a single string, so that serving the feed to calendar clients,
+which poll it often, is little more than joining cached strings.
+"""
+
+import datetime as dt
+from collections.abc import Iterator
+
+from django.core.cache import cache
+
+from lectionary.services.calendar import get_data_version, iter_calendar
+
+PRODID = "-//lectionary2019.com//Lectionary//EN"
+UID_DOMAIN = "lectionary2019.com"
+ICS_TIMEOUT = 60 * 60 * 24 * 30
+MAX_LINE_OCTETS = 75
+
+
+def escape_text(value: str) -> str:
+    return (
+        value.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def fold_line(line: str) -> str:
+    """Fold a content line into lines of at most 75 octets, without
+    splitting any multi-byte characters.
+    """
+
+    encoded = line.encode()
+    if len(encoded) <= MAX_LINE_OCTETS:
+        return line + "\r\n"
+
+    lines = []
+    start = 0
+    limit = MAX_LINE_OCTETS
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        # Back up to the start of a character (continuation bytes are 10xxxxxx)
+        while end < len(encoded) and encoded[end] & 0xC0 == 0x80:
+            end -= 1
+        lines.append(encoded[start:end].decode())
+        start = end
+        # Continuation lines begin with a space, which counts towards the limit
+        limit = MAX_LINE_OCTETS - 1
+    return "\r\n ".join(lines) + "\r\n"
+
+
+def format_date(date: dt.date) -> str:
+    # Unlike strftime("%Y"), isoformat() pads years before 1000 to 4 digits
+    return date.isoformat().replace("-", "")
+
+
+def get_dtstamp(version: int) -> str:
+    # The data version is the time (in ns) at which the data last changed
+    stamp = dt.datetime.fromtimestamp(version / 1e9, dt.timezone.utc)
+    return stamp.strftime("%Y%m%dT%H%M%SZ")
+
+
+def build_events(year: int, base_url: str, version: int) -> str:
+    """Render every entry of a civil year as a VEVENT."""
+
+    dtstamp = get_dtstamp(version)
+    lines = []
+    start = dt.date(year, 1, 1)
+    end = dt.date(year, 12, 31)
+    for date, entries in iter_calendar(start, end):
+        for entry in entries:
+            day = entry["day"]
+            summary = day["name"]
+            if day["service"]:
+                summary += f": {day['service']}"
+            pk = day["url"].strip("/")
+            lines += [
+                "BEGIN:VEVENT",
+                f"UID:{format_date(date)}-{pk}@{UID_DOMAIN}",
+                f"DTSTAMP:{dtstamp}",
+                f"DTSTART;VALUE=DATE:{format_date(date)}",
+                f"DTEND;VALUE=DATE:{format_date(date + dt.timedelta(days=1))}",
+                f"SUMMARY:{escape_text(summary)}",
+                "DESCRIPTION:"
+                + escape_text(
+                    f"{entry['season']} — Year {entry['year']}\n\n"
+                    + "\n".join(entry["lessons"])
+                ),
+                f"CATEGORIES:{escape_text(entry['season'] or '')}",
+                f"URL:{base_url.rstrip('/')}{day['url']}",
+                "TRANSP:TRANSPARENT",
+                "END:VEVENT",
+            ]
+    return "".join(fold_line(line) for line in lines)
+
+
+def get_events(year: int, base_url: str, version: int) -> str:
+    key = f"ics:{version}:{base_url}:{year}"
+    events = cache.get(key)
+    if events is None:
+        events = build_events(year, base_url, version)
+        cache.set(key, events, timeout=ICS_TIMEOUT)
+    return events
+
+
+def iter_ics(start_year: int, end_year: int, base_url: str) -> Iterator[str]:
+    """Yield the feed for a range of civil years one year at a time."""
+
+    version = get_data_version()
+    yield "".join(
+        fold_line(line)
+        for line in [
+            "BEGIN:VCALENDAR",
+            "VERSION:2.0",
+            f"PRODID:{PRODID}",
+            "CALSCALE:GREGORIAN",
+            "METHOD:PUBLISH",
+            "X-WR-CALNAME:Lectionary",
+            "REFRESH-INTERVAL;VALUE=DURATION:PT12H",
+            "X-PUBLISHED-TTL:PT12H",
+        ]
+    )
+    for year in range(start_year, end_year + 1):
+        yield get_events(year, base_url, version)
+    yield fold_line("END:VCALENDAR")
@@ -0,0 +1,108 @@
+"""The worker side of the queue of lessons to fetch (see FetchJob), run by
+`manage.py fetch_lessons`.
+
+Jobs are claimed in batches and their passages fetched by a pool of
+threads, so that no more than a fixed number of requests are made to the
+scripture provider at once. A job which fails is tried again later, after
+a delay which grows with each attempt, and given up after MAX_ATTEMPTS
+(the lesson is queued again the next time its page is visited).
+"""
+
+import datetime as dt
+import logging
+from concurrent.futures import Executor
+
+from django.db import transaction
+from django.utils import timezone
+
+from lectionary.models import FetchJob, Lesson
+from lectionary.services.resilience import backoff
+from lectionary.services.scripture import (
+    ESVRateLimitError,
+    RateLimiter,
+    ScriptureError,
+    get_provider,
+)
+
+MAX_ATTEMPTS = 5
+# Seconds before the first retry of a job, doubling up to RETRY_MAX
+RETRY_BASE = 30
+RETRY_MAX = 60 * 60
+# Jobs claimed by a worker which dies are claimed again after this long
+LEASE = dt.timedelta(minutes=5)
+
+logger = logging.getLogger("django")
+
+
+def fetch(job: FetchJob, limiter: RateLimiter):
+    """Return the (html, text) of the job's lesson, or the exception which
+    prevented fetching it.
+    """
+
+    limiter.wait()
+    try:
+        html, text = get_provider().get_passage(job.lesson.reference)
+    except ESVRateLimitError as e:
+        limiter.pause(e.retry_after)
+        return e
+    except Exception as e:
+        return e
+    if not (html and text):
+        return ScriptureError(f"{job.lesson.reference} was not found")
+    return html, text
+
+
+def complete(job: FetchJob, passage: tuple[str, str]):
+    lesson = job.lesson
+    lesson.set_content(*passage)
+    with transaction.atomic():
+        lesson.save(update_fields=Lesson.CONTENT_FIELDS)
+        job.delete()
+
+
+def retry(job: FetchJob, error: Exception) -> bool:
+    """Schedule the job to be tried again, returning False if it has been
+    given up instead.
+    """
+
+    if job.attempts >= MAX_ATTEMPTS:
+        logger.error(f"Gave up fetching {job.lesson}: {error}")
+        job.delete()
+        return False
+
+    delay = backoff(job.attempts - 1, RETRY_BASE, RETRY_MAX)
+    if isinstance(error, ESVRateLimitError):
+        delay = max(delay, error.retry_after)
+    job.run_after = timezone.now() + dt.timedelta(seconds=delay)
+    job.last_error = str(error)
+    job.save(update_fields=["run_after", "last_error"])
+    return True
+
+
+def run_jobs(executor: Executor, limiter: RateLimiter, batch_size: int) -> dict:
+    """Claim a batch of due jobs and run them on the executor, returning
+    counts of the jobs which were done, retried and given up.
+    """
+
+    counts = {"done": 0, "retried": 0, "failed": 0}
+    jobs = FetchJob.objects.claim(batch_size, LEASE)
+
+    # Lessons may have been fetched since they were queued
+    due = []
+    for job in jobs:
+        if job.lesson.is_stale():
+            due.append(job)
+        else:
+            job.delete()
+            counts["done"] += 1
+
+    results = executor.map(lambda job: fetch(job, limiter), due)
+    for job, result in zip(due, results):
+        if not isinstance(result, Exception):
+            complete(job, result)
+            counts["done"] += 1
+        elif retry(job, result):
+            counts["retried"] += 1
+        else:
+            counts["failed"] += 1
+    return counts
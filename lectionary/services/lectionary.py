@@ -1,333 +1,392 @@
 import datetime as dt
+from functools import lru_cache
+from typing import NamedTuple
 
 from dateutil.easter import easter
 from dateutil.relativedelta import SU, relativedelta
 
+PRINCIPAL_FEASTS = {
+    (12, 25): "Christmas Day",
+    (1, 6): "The Epiphany",
+    (11, 1): "All Saints' Day",
+}
+
+PRINCIPAL_EVES = {
+    (12, 24): "Christmas Eve",
+}
+
+RED_LETTER_DAYS = {
+    (11, 30): "Saint Andrew",
+    (12, 21): "Saint Thomas",
+    (12, 26): "Saint Stephen",
+    (12, 27): "Saint John",
+    (12, 28): "Holy Innocents",
+    (1, 1): "Holy Name",
+    (1, 18): "Confession of Saint Peter",
+    (1, 25): "Conversion of Saint Paul",
+    (2, 2): "The Presentation",
+    (2, 24): "Saint Matthias",
+    (3, 19): "Saint Joseph",
+    (3, 25): "The Annunciation",
+    (4, 25): "Saint Mark",
+    (5, 1): "Saint Philip and Saint James",
+    (5, 31): "The Visitation",
+    (6, 11): "Saint Barnabas",
+    (6, 24): "Nativity of Saint John the Baptist",
+    (6, 29): "Saint Peter and Saint Paul",
+    (7, 22): "Saint Mary Magdalene",
+    (7, 25): "Saint James",
+    (8, 6): "The Transfiguration",
+    (8, 15): "Saint Mary the Virgin",
+    (8, 24): "Saint Bartholomew",
+    (9, 14): "Holy Cross Day",
+    (9, 21): "Saint Matthew",
+    (9, 29): "Saint Michael and All Angels",
+    (10, 18): "Saint Luke",
+    (10, 23): "Saint James of Jerusalem",
+    (10, 28): "Saint Simon and Saint Jude",
+}
+
+HOLY_WEEK = [
+    "Palm Sunday",
+    "Monday in Holy Week",
+    "Tuesday in Holy Week",
+    "Wednesday in Holy Week",
+    "Maundy Thursday",
+    "Good Friday",
+    "Holy Saturday",
+]
+
+EASTER_WEEK = [
+    "Monday in Easter Week",
+    "Tuesday in Easter Week",
+    "Wednesday in Easter Week",
+    "Thursday in Easter Week",
+    "Friday in Easter Week",
+    "Saturday in Easter Week",
+]
+
+ORDINALS = [
+    "First",
+    "Second",
+    "Third",
+    "Fourth",
+    "Fifth",
+    "Sixth",
+    "Seventh",
+    "Eighth",
+]
+
+
+# datetime.date only covers the years 1 to 9999, but the church years at
+# either end reach into the years 0 and 10000. The Gregorian calendar (and
+# its weekdays) repeats every 400 years, so dates in those years are worked
+# out as ordinals from the same dates 400 years along.
+CYCLE_YEARS = 400
+CYCLE_DAYS = 146097
+MIN_ORDINAL = dt.date.min.toordinal()
+MAX_ORDINAL = dt.date.max.toordinal()
+
+
+def get_ordinal(year: int, month: int, day: int) -> int:
+    """Return the proleptic Gregorian ordinal of a date in any year from 0
+    to 10000 (which is less than 1, or more than that of date.max, in the
+    years datetime.date can't represent).
+    """
+
+    cycles = 0
+    if year < dt.MINYEAR:
+        cycles = 1
+    elif year > dt.MAXYEAR:
+        cycles = -1
+    return (
+        dt.date(year + CYCLE_YEARS * cycles, month, day).toordinal()
+        - CYCLE_DAYS * cycles
+    )
+
+
+def get_advent_sunday(year: int) -> int:
+    """Return the ordinal of the fourth Sunday before Christmas Day."""
+
+    # Ordinal 7 is a Sunday, so ordinal % 7 == 0 for every Sunday
+    christmas_eve = get_ordinal(year, 12, 24)
+    return christmas_eve - christmas_eve % 7 - 21
+
+
+def get_easter_day(year: int) -> int:
+    """Return the ordinal of Easter Day. Easter doesn't repeat every 400
+    years, so the one given for the year 10000 is only roughly right. That
+    is fine, since none of the dates which depend on it can be represented.
+    """
+
+    if year > dt.MAXYEAR:
+        return easter(year - CYCLE_YEARS).toordinal() + CYCLE_DAYS
+    return easter(year).toordinal()
+
+
+@lru_cache(maxsize=512)
+def get_moveable_dates(year: int) -> dict[str, dt.date]:
+    """Return the dates which move from one civil year to the next.
+    The returned dict is shared between callers and must not be mutated.
+    """
+
+    easter_day = easter(year)
+    return {
+        "easter_day": easter_day,
+        "ash_wednesday": easter_day - dt.timedelta(days=46),
+        "pentecost": easter_day + dt.timedelta(days=49),
+        "advent_sunday": dt.date(year, 12, 25) + relativedelta(days=-1, weekday=SU(-4)),
+    }
+
+
+class LiturgicalDay(NamedTuple):
+    date: dt.date
+    names: tuple[str, ...]
+    season: str
+    year: str
+
+
+class LiturgicalYear:
+    """Every date of a single church year, which runs from the First
+    Sunday of Advent in `year` up to the First Sunday of Advent in the
+    following civil year. The whole table is computed in one pass using
+    proleptic Gregorian ordinals, so looking up a date (or a run of dates)
+    is a list index (or slice).
+
+    The church years beginning in 0 and 9999 are cut short at the bounds
+    of datetime.date: the former starts at date.min, and the latter has no
+    `end`, since it ends after date.max.
+    """
+
+    def __init__(self, year: int):
+        self.year = year
+        self.letter = "ABC"[year % 3]
+        self.advent_sunday = get_advent_sunday(year)
+        self.next_advent_sunday = get_advent_sunday(year + 1)
+
+        self.first = max(self.advent_sunday, MIN_ORDINAL)
+        self.last = min(self.next_advent_sunday - 1, MAX_ORDINAL)
+        self.start = dt.date.fromordinal(self.first)
+        self.end = None
+        if self.next_advent_sunday <= MAX_ORDINAL:
+            self.end = dt.date.fromordinal(self.next_advent_sunday)
+
+        self.easter_day = get_easter_day(year + 1)
+        self.ash_wednesday = self.easter_day - 46
+        self.pentecost = self.easter_day + 49
+
+        self.days = self._get_days()
+
+    def __getitem__(self, date: dt.date) -> LiturgicalDay:
+        ordinal = date.toordinal()
+        if not self.first <= ordinal <= self.last:
+            raise KeyError(date)
+        return self.days[ordinal - self.first]
+
+    def __contains__(self, date: dt.date) -> bool:
+        return self.first <= date.toordinal() <= self.last
+
+    def slice(self, first: int, last: int) -> list[LiturgicalDay]:
+        """Return the days between two ordinals (inclusive), clamped to
+        the bounds of this church year.
+        """
+
+        first = max(first, self.first) - self.first
+        last = min(last, self.last) - self.first
+        return self.days[first : last + 1]
+
+    def _get_days(self) -> list[LiturgicalDay]:
+        rules = [
+            self._principal_feasts(),
+            self._ash_wednesday(),
+            self._holy_week(),
+            self._easter_week(),
+            self._sundays(),
+            self._principal_eves(),
+            self._red_letter_days(),
+        ]
+
+        # Each rule yields at most one name per date, so merging them in
+        # order keeps the names in order of precedence.
+        names = [[] for _ in range(self.last - self.first + 1)]
+        for rule in rules:
+            for ordinal, name in rule.items():
+                if self.first <= ordinal <= self.last:
+                    names[ordinal - self.first].append(name)
+
+        days = []
+        for season, start, end in self._seasons():
+            for ordinal in range(max(start, self.first), min(end, self.last + 1)):
+                days.append(
+                    LiturgicalDay(
+                        dt.date.fromordinal(ordinal),
+                        tuple(names[ordinal - self.first]),
+                        season,
+                        self.letter,
+                    )
+                )
+        return days
+
+    def _seasons(self) -> list[tuple[str, int, int]]:
+        christmas_day = self._ordinal(self.year, 12, 25)
+        epiphany = self._ordinal(self.year + 1, 1, 6)
+        return [
+            ("Advent", self.first, christmas_day),
+            ("Christmas", christmas_day, epiphany),
+            ("Epiphany", epiphany, self.ash_wednesday),
+            ("Lent", self.ash_wednesday, self.easter_day),
+            ("Easter", self.easter_day, self.pentecost),
+            ("Pentecost", self.pentecost, self.last + 1),
+        ]
+
+    @staticmethod
+    def _ordinal(year: int, month: int, day: int) -> int:
+        return get_ordinal(year, month, day)
+
+    @staticmethod
+    def _sunday_after(ordinal: int) -> int:
+        # Ordinal 7 is a Sunday, so ordinal % 7 == 0 for every Sunday.
+        return ordinal + 7 - ordinal % 7
+
+    def _fixed(self, calendar: dict[tuple[int, int], str]) -> dict[int, str]:
+        # A church year can be longer than a civil year, so a fixed date
+        # may fall within it twice (e.g. Saint Andrew).
+        return {
+            self._ordinal(year, month, day): name
+            for year in (self.year, self.year + 1)
+            for (month, day), name in calendar.items()
+        }
+
+    def _principal_feasts(self) -> dict[int, str]:
+        feasts = {
+            self.easter_day: "Easter Day",
+            self.easter_day + 39: "Ascension Day",
+            self.pentecost: "Day of Pentecost",
+            self.easter_day + 56: "Trinity Sunday",
+        }
+        feasts.update(self._fixed(PRINCIPAL_FEASTS))
+        return feasts
+
+    def _principal_eves(self) -> dict[int, str]:
+        eves = {self.easter_day - 1: "Easter Eve"}
+        eves.update(self._fixed(PRINCIPAL_EVES))
+        return eves
+
+    def _ash_wednesday(self) -> dict[int, str]:
+        return {self.ash_wednesday: "Ash Wednesday"}
+
+    def _holy_week(self) -> dict[int, str]:
+        palm_sunday = self.easter_day - 7
+        return {palm_sunday + i: name for i, name in enumerate(HOLY_WEEK)}
+
+    def _easter_week(self) -> dict[int, str]:
+        return {self.easter_day + i + 1: name for i, name in enumerate(EASTER_WEEK)}
+
+    def _sundays(self) -> dict[int, str]:
+        sundays = {}
+        sundays.update(self._advent_sundays())
+        sundays.update(self._christmas_sundays())
+        sundays.update(self._epiphany_sundays())
+        sundays.update(self._lent_sundays())
+        sundays.update(self._easter_sundays())
+        sundays.update(self._pentecost_sundays())
+        return sundays
+
+    def _advent_sundays(self) -> dict[int, str]:
+        return {
+            self.advent_sunday + 7 * i: f"{ORDINALS[i]} Sunday of Advent"
+            for i in range(4)
+        }
+
+    def _christmas_sundays(self) -> dict[int, str]:
+        first_sunday = self._sunday_after(self._ordinal(self.year, 12, 25))
+        sundays = {first_sunday: "First Sunday after Christmas"}
+
+        second_sunday = first_sunday + 7
+        if second_sunday < self._ordinal(self.year + 1, 1, 6):
+            sundays[second_sunday] = "Second Sunday after Christmas"
+        return sundays
+
+    def _epiphany_sundays(self) -> dict[int, str]:
+        first_sunday = self._sunday_after(self._ordinal(self.year + 1, 1, 6))
+        sundays = {}
+        for i, ordinal in enumerate(ORDINALS):
+            sunday = first_sunday + 7 * i
+            if sunday >= self.ash_wednesday:
+                break
+            sundays[sunday] = f"{ordinal} Sunday after Epiphany"
+
+        # The number of Sundays after Epiphany can range from 4 to 9.
+        # To account for this, the final two Sundays take precedence.
+        sundays[self.easter_day - 56] = "Second to Last Sunday after Epiphany"
+        sundays[self.easter_day - 49] = "Last Sunday after Epiphany"
+        return sundays
+
+    def _lent_sundays(self) -> dict[int, str]:
+        return {
+            self.easter_day - 7 * (6 - i): f"{ORDINALS[i]} Sunday in Lent"
+            for i in range(5)
+        }
+
+    def _easter_sundays(self) -> dict[int, str]:
+        sundays = {
+            self.easter_day + 7 * i: f"{ORDINALS[i]} Sunday of Easter"
+            for i in range(1, 6)
+        }
+        sundays[self.easter_day + 42] = "Sunday after Ascension Day"
+        return sundays
+
+    def _pentecost_sundays(self) -> dict[int, str]:
+        # Propers are counted backwards from the following Advent Sunday,
+        # so the earliest ones are skipped when Pentecost is late.
+        sundays = {}
+        for proper in range(1, 30):
+            sunday = self.next_advent_sunday - 7 * (30 - proper)
+            if sunday >= self.pentecost:
+                sundays[sunday] = f"Proper {proper}"
+        return sundays
+
+    def _red_letter_days(self) -> dict[int, str]:
+        return self._fixed(RED_LETTER_DAYS)
+
+
+@lru_cache(maxsize=256)
+def get_liturgical_year(year: int) -> LiturgicalYear:
+    """Return the (process-wide cached) church year beginning in `year`."""
+
+    return LiturgicalYear(year)
+
+
+def get_liturgical_year_containing(date: dt.date) -> LiturgicalYear:
+    if date.toordinal() >= get_advent_sunday(date.year):
+        return get_liturgical_year(date.year)
+    return get_liturgical_year(date.year - 1)
+
 
 class Lectionary:
     def __init__(self, date: dt.date):
         self.date = date
-        self.moveable = self._get_moveable()
-        self.year = self._get_year()
-        self.season = self._get_season()
-        self.names = self._get_names()
-
-    def _get_moveable(self) -> dict[str, dt.date]:
-        easter_day = easter(self.date.year)
-        moveable = {
-            "easter_day": easter_day,
-            "ash_wednesday": easter_day - dt.timedelta(days=46),
-            "pentecost": easter_day + dt.timedelta(days=49),
-            "advent_sunday": dt.date(self.date.year, 12, 25)
-            + relativedelta(days=-1, weekday=SU(-4)),
-        }
-        return moveable
-
-    def _get_year(self) -> str:
-        if self.date >= self.moveable["advent_sunday"]:
-            start_year = self.date.year
-        else:
-            start_year = self.date.year - 1
-
-        if start_year % 3 == 0:
-            return "A"
-        if start_year % 3 == 1:
-            return "B"
-        return "C"
-
-    def _get_season(self) -> str:
-        if self.date < dt.date(self.date.year, 1, 6):
-            return "Christmas"
-        if self.date < self.moveable["ash_wednesday"]:
-            return "Epiphany"
-        if self.date < self.moveable["easter_day"]:
-            return "Lent"
-        if self.date < self.moveable["pentecost"]:
-            return "Easter"
-        if self.date < self.moveable["advent_sunday"]:
-            return "Pentecost"
-        if self.date < dt.date(self.date.year, 12, 25):
-            return "Advent"
-        return "Christmas"
-
-    def _get_names(self) -> list[str]:
-        names = []
-        names.append(self._check_principal_feasts())
-        names.append(self._check_ash_wednesday())
-        names.append(self._check_holy_week())
-        names.append(self._check_easter_week())
-        names.append(self._check_sundays())
-        names.append(self._check_principal_eves())
-        names.append(self._check_red_letter_days())
-        return [n for n in names if n]
-
-    def _check_principal_feasts(self) -> str | None:
-        if self.date == self.moveable["easter_day"]:
-            return "Easter Day"
-        if self.date == self.moveable["easter_day"] + dt.timedelta(days=39):
-            return "Ascension Day"
-        if self.date == self.moveable["pentecost"]:
-            return "Day of Pentecost"
-        if self.date == self.moveable["easter_day"] + dt.timedelta(days=56):
-            return "Trinity Sunday"
-        if self.date == dt.date(self.date.year, 12, 25):
-            return "Christmas Day"
-        if self.date == dt.date(self.date.year, 1, 6):
-            return "The Epiphany"
-        if self.date == dt.date(self.date.year, 11, 1):
-            return "All Saints' Day"
-
-    def _check_principal_eves(self) -> str | None:
-        if self.date == self.moveable["easter_day"] - dt.timedelta(days=1):
-            return "Easter Eve"
-        if self.date == dt.date(self.date.year, 12, 24):
-            return "Christmas Eve"
-
-    def _check_ash_wednesday(self) -> str | None:
-        if self.date == self.moveable["ash_wednesday"]:
-            return "Ash Wednesday"
-
-    def _check_holy_week(self) -> str | None:
-        date_delta = self.moveable["easter_day"] - self.date
-        if date_delta.days == 7:
-            return "Palm Sunday"
-        if date_delta.days == 6:
-            return "Monday in Holy Week"
-        if date_delta.days == 5:
-            return "Tuesday in Holy Week"
-        if date_delta.days == 4:
-            return "Wednesday in Holy Week"
-        if date_delta.days == 3:
-            return "Maundy Thursday"
-        if date_delta.days == 2:
-            return "Good Friday"
-        if date_delta.days == 1:
-            return "Holy Saturday"
-
-    def _check_easter_week(self) -> str | None:
-        date_delta = self.date - self.moveable["easter_day"]
-        if date_delta.days == 1:
-            return "Monday in Easter Week"
-        if date_delta.days == 2:
-            return "Tuesday in Easter Week"
-        if date_delta.days == 3:
-            return "Wednesday in Easter Week"
-        if date_delta.days == 4:
-            return "Thursday in Easter Week"
-        if date_delta.days == 5:
-            return "Friday in Easter Week"
-        if date_delta.days == 6:
-            return "Saturday in Easter Week"
-
-    def _check_sundays(self) -> str | None:
-        if self.date.weekday() != 6:
-            return None
-
-        if self.season == "Advent":
-            return self._check_advent_sundays()
-        if self.season == "Christmas":
-            return self._check_christmas_sundays()
-        if self.season == "Epiphany":
-            return self._check_epiphany_sundays()
-        if self.season == "Lent":
-            return self._check_lent_sundays()
-        if self.season == "Easter":
-            return self._check_easter_sundays()
-        if self.season == "Pentecost":
-            return self._check_pentecost_sundays()
-
-    def _check_advent_sundays(self) -> str | None:
-        date_delta = self.date - self.moveable["advent_sunday"]
-        if date_delta.days == 0:
-            return "First Sunday of Advent"
-        if date_delta.days == 7:
-            return "Second Sunday of Advent"
-        if date_delta.days == 14:
-            return "Third Sunday of Advent"
-        if date_delta.days == 21:
-            return "Fourth Sunday of Advent"
-
-    def _check_christmas_sundays(self) -> str | None:
-        christmas_day = dt.date(self.date.year, 12, 25)
-        if christmas_day < self.date <= christmas_day + dt.timedelta(days=7):
-            return "First Sunday after Christmas"
-        else:
-            return "Second Sunday after Christmas"
-
-    def _check_epiphany_sundays(self) -> str | None:
-        first_sunday_of_epiphany = dt.date(self.date.year, 1, 6) + relativedelta(
-            days=+1, weekday=SU(+1)
-        )
-        date_delta = self.date - first_sunday_of_epiphany
+        self.moveable = dict(get_moveable_dates(date.year))
 
-        # The number of Sundays after Epiphany can range from 4 to 9.
-        # To account for this, check for the final two Sundays first.
-        if self.date == self.moveable["easter_day"] - dt.timedelta(days=56):
-            return "Second to Last Sunday after Epiphany"
-        if self.date == self.moveable["easter_day"] - dt.timedelta(days=49):
-            return "Last Sunday after Epiphany"
-        if date_delta.days == 0:
-            return "First Sunday after Epiphany"
-        if date_delta.days == 7:
-            return "Second Sunday after Epiphany"
-        if date_delta.days == 14:
-            return "Third Sunday after Epiphany"
-        if date_delta.days == 21:
-            return "Fourth Sunday after Epiphany"
-        if date_delta.days == 28:
-            return "Fifth Sunday after Epiphany"
-        if date_delta.days == 35:
-            return "Sixth Sunday after Epiphany"
-        if date_delta.days == 42:
-            return "Seventh Sunday after Epiphany"
-        if date_delta.days == 49:
-            return "Eighth Sunday after Epiphany"
-
-    def _check_lent_sundays(self) -> str | None:
-        date_delta = self.moveable["easter_day"] - self.date
-        if date_delta.days == 42:
-            return "First Sunday in Lent"
-        if date_delta.days == 35:
-            return "Second Sunday in Lent"
-        if date_delta.days == 28:
-            return "Third Sunday in Lent"
-        if date_delta.days == 21:
-            return "Fourth Sunday in Lent"
-        if date_delta.days == 14:
-            return "Fifth Sunday in Lent"
-
-    def _check_easter_sundays(self) -> str | None:
-        date_delta = self.date - self.moveable["easter_day"]
-        if date_delta.days == 7:
-            return "Second Sunday of Easter"
-        if date_delta.days == 14:
-            return "Third Sunday of Easter"
-        if date_delta.days == 21:
-            return "Fourth Sunday of Easter"
-        if date_delta.days == 28:
-            return "Fifth Sunday of Easter"
-        if date_delta.days == 35:
-            return "Sixth Sunday of Easter"
-        if date_delta.days == 42:
-            return "Sunday after Ascension Day"
-
-    def _check_pentecost_sundays(self) -> str | None:
-        date_delta = self.moveable["advent_sunday"] - self.date
-        if date_delta.days == 203:
-            return "Proper 1"
-        if date_delta.days == 196:
-            return "Proper 2"
-        if date_delta.days == 189:
-            return "Proper 3"
-        if date_delta.days == 182:
-            return "Proper 4"
-        if date_delta.days == 175:
-            return "Proper 5"
-        if date_delta.days == 168:
-            return "Proper 6"
-        if date_delta.days == 161:
-            return "Proper 7"
-        if date_delta.days == 154:
-            return "Proper 8"
-        if date_delta.days == 147:
-            return "Proper 9"
-        if date_delta.days == 140:
-            return "Proper 10"
-        if date_delta.days == 133:
-            return "Proper 11"
-        if date_delta.days == 126:
-            return "Proper 12"
-        if date_delta.days == 119:
-            return "Proper 13"
-        if date_delta.days == 112:
-            return "Proper 14"
-        if date_delta.days == 105:
-            return "Proper 15"
-        if date_delta.days == 98:
-            return "Proper 16"
-        if date_delta.days == 91:
-            return "Proper 17"
-        if date_delta.days == 84:
-            return "Proper 18"
-        if date_delta.days == 77:
-            return "Proper 19"
-        if date_delta.days == 70:
-            return "Proper 20"
-        if date_delta.days == 63:
-            return "Proper 21"
-        if date_delta.days == 56:
-            return "Proper 22"
-        if date_delta.days == 49:
-            return "Proper 23"
-        if date_delta.days == 42:
-            return "Proper 24"
-        if date_delta.days == 35:
-            return "Proper 25"
-        if date_delta.days == 28:
-            return "Proper 26"
-        if date_delta.days == 21:
-            return "Proper 27"
-        if date_delta.days == 14:
-            return "Proper 28"
-        if date_delta.days == 7:
-            return "Proper 29"
-
-    def _check_red_letter_days(self) -> str | None:
-        if self.date == dt.date(self.date.year, 11, 30):
-            return "Saint Andrew"
-        if self.date == dt.date(self.date.year, 12, 21):
-            return "Saint Thomas"
-        if self.date == dt.date(self.date.year, 12, 26):
-            return "Saint Stephen"
-        if self.date == dt.date(self.date.year, 12, 27):
-            return "Saint John"
-        if self.date == dt.date(self.date.year, 12, 28):
-            return "Holy Innocents"
-        if self.date == dt.date(self.date.year, 1, 1):
-            return "Holy Name"
-        if self.date == dt.date(self.date.year, 1, 18):
-            return "Confession of Saint Peter"
-        if self.date == dt.date(self.date.year, 1, 25):
-            return "Conversion of Saint Paul"
-        if self.date == dt.date(self.date.year, 2, 2):
-            return "The Presentation"
-        if self.date == dt.date(self.date.year, 2, 24):
-            return "Saint Matthias"
-        if self.date == dt.date(self.date.year, 3, 19):
-            return "Saint Joseph"
-        if self.date == dt.date(self.date.year, 3, 25):
-            return "The Annunciation"
-        if self.date == dt.date(self.date.year, 4, 25):
-            return "Saint Mark"
-        if self.date == dt.date(self.date.year, 5, 1):
-            return "Saint Philip and Saint James"
-        if self.date == dt.date(self.date.year, 5, 31):
-            return "The Visitation"
-        if self.date == dt.date(self.date.year, 6, 11):
-            return "Saint Barnabas"
-        if self.date == dt.date(self.date.year, 6, 24):
-            return "Nativity of Saint John the Baptist"
-        if self.date == dt.date(self.date.year, 6, 29):
-            return "Saint Peter and Saint Paul"
-        if self.date == dt.date(self.date.year, 7, 22):
-            return "Saint Mary Magdalene"
-        if self.date == dt.date(self.date.year, 7, 25):
-            return "Saint James"
-        if self.date == dt.date(self.date.year, 8, 6):
-            return "The Transfiguration"
-        if self.date == dt.date(self.date.year, 8, 15):
-            return "Saint Mary the Virgin"
-        if self.date == dt.date(self.date.year, 8, 24):
-            return "Saint Bartholomew"
-        if self.date == dt.date(self.date.year, 9, 14):
-            return "Holy Cross Day"
-        if self.date == dt.date(self.date.year, 9, 21):
-            return "Saint Matthew"
-        if self.date == dt.date(self.date.year, 9, 29):
-            return "Saint Michael and All Angels"
-        if self.date == dt.date(self.date.year, 10, 18):
-            return "Saint Luke"
-        if self.date == dt.date(self.date.year, 10, 23):
-            return "Saint James of Jerusalem"
-        if self.date == dt.date(self.date.year, 10, 28):
-            return "Saint Simon and Saint Jude"
+        day = get_liturgical_year_containing(date)[date]
+        self.year = day.year
+        self.season = day.season
+        self.names = list(day.names)
+
+    @classmethod
+    def resolve_range(cls, start: dt.date, end: dt.date) -> list[LiturgicalDay]:
+        """Return the names, season, and year of every date from start to
+        end (inclusive). Each church year the range touches is computed
+        at most once, and the days are sliced straight out of its table.
+        """
+
+        days = []
+        first = start.toordinal()
+        last = end.toordinal()
+        year = get_liturgical_year_containing(start).year
+        while first <= last:
+            liturgical_year = get_liturgical_year(year)
+            days.extend(liturgical_year.slice(first, last))
+            first = liturgical_year.last + 1
+            year += 1
+        return days
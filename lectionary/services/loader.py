@@ -0,0 +1,127 @@
+"""Bulk loaders for the JSON files in data/.
+
+These are called from the data migrations with the historical app
+registry, so they must only use fields which exist on the models at the
+time those migrations run.
+"""
+
+import json
+
+from django.conf import settings
+
+BATCH_SIZE = 1000
+
+
+def read_data(name: str):
+    with open(settings.BASE_DIR / "data" / name) as f:
+        return json.load(f)
+
+
+def load_day_lessons(apps):
+    Day = apps.get_model("lectionary", "Day")
+    Lesson = apps.get_model("lectionary", "Lesson")
+    DayLesson = apps.get_model("lectionary", "DayLesson")
+
+    data = read_data("lectionary.json")
+
+    days = []
+    for day_name, val in data.items():
+        if day_name.startswith("Christmas") or day_name.startswith("Easter"):
+            for service_name, years in val.items():
+                for year_name, lessons in years.items():
+                    day = Day(name=day_name, year=year_name, service=service_name)
+                    days.append((day, lessons))
+        else:
+            for year_name, lessons in val.items():
+                day = Day(name=day_name, year=year_name)
+                days.append((day, lessons))
+
+    # Lessons are shared between days, so each reference is only created once
+    references = {}
+    for _, lessons in days:
+        for lesson_list in lessons.values():
+            references.setdefault(" or ".join(lesson_list), None)
+    for lesson in Lesson.objects.filter(reference__in=references):
+        references[lesson.reference] = lesson
+    new_lessons = [Lesson(reference=ref) for ref, val in references.items() if not val]
+    for lesson in Lesson.objects.bulk_create(new_lessons, batch_size=BATCH_SIZE):
+        references[lesson.reference] = lesson
+
+    Day.objects.bulk_create([day for day, _ in days], batch_size=BATCH_SIZE)
+    DayLesson.objects.bulk_create(
+        [
+            DayLesson(day=day, lesson=references[" or ".join(lesson_list)])
+            for day, lessons in days
+            for lesson_list in lessons.values()
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def load_seasons(apps):
+    Day = apps.get_model("lectionary", "Day")
+
+    data = read_data("seasons.json")
+
+    days = list(Day.objects.filter(name__in=data))
+    for day in days:
+        day.season = data[day.name]["season"]
+        day.color = data[day.name]["color"]
+    Day.objects.bulk_update(days, ["season", "color"], batch_size=BATCH_SIZE)
+
+
+def load_collects(apps):
+    Day = apps.get_model("lectionary", "Day")
+    Collect = apps.get_model("lectionary", "Collect")
+    DayCollect = apps.get_model("lectionary", "DayCollect")
+
+    data = read_data("collects.json")
+
+    days = {}
+    for day in Day.objects.filter(name__in=data).order_by("pk"):
+        days.setdefault(day.name, []).append(day)
+
+    collects = [
+        (name, Collect(text=text)) for name, texts in data.items() for text in texts
+    ]
+    Collect.objects.bulk_create([c for _, c in collects], batch_size=BATCH_SIZE)
+    DayCollect.objects.bulk_create(
+        [
+            DayCollect(day=day, collect=collect)
+            for name, collect in collects
+            for day in days.get(name, [])
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def load_psalter(apps):
+    Psalm = apps.get_model("psalter", "Psalm")
+    Verse = apps.get_model("psalter", "Verse")
+
+    data = read_data("psalter.json")
+
+    psalms = Psalm.objects.bulk_create(
+        [Psalm(number=p["number"], title=p["latin_title"]) for p in data],
+        batch_size=BATCH_SIZE,
+    )
+    Verse.objects.bulk_create(
+        [
+            Verse(
+                number=v["number"],
+                first_half=v["first_half"],
+                second_half=v["second_half"],
+                psalm=psalm,
+            )
+            for psalm, p in zip(psalms, data)
+            for v in p["verses"]
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def load_all(apps):
+    load_psalter(apps)
+    load_day_lessons(apps)
+    load_seasons(apps)
+    load_collects(apps)
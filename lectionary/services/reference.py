@@ -0,0 +1,168 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import NamedTuple
+
+SINGLE_CHAPTER_BOOKS = {"Obadiah", "Philemon", "2 John", "3 John", "Jude"}
+
+BOOK_RE = re.compile(r"((?:[1-3]\s)?[A-Za-z][A-Za-z ]*?)\s*(?=\d|$)")
+RANGE_RE = re.compile(r"(?:(\d+):)?(\d+)[a-z]?(?:-(?:(\d+):)?(\d+)[a-z]?)?")
+SEPARATOR_RE = re.compile(r"[;,]")
+ALTERNATIVE_RE = re.compile(r";| or ")
+PARENS_RE = re.compile(r"\(|\)")
+SPACING_RE = re.compile(r"\s*([:;,])\s*")
+WHITESPACE_RE = re.compile(r"\s+")
+OPTIONAL_RE = re.compile(r"\([^)]*\),?\s*")
+
+
+class VerseRange(NamedTuple):
+    start_chapter: int
+    start_verse: int
+    end_chapter: int
+    end_verse: int
+
+
+@dataclass(frozen=True)
+class Reference:
+    """A single parsed scripture reference, e.g. "Psalm 72:1-15, (16-19)".
+    Verses are kept as a tuple of inclusive ranges, with adjacent ranges
+    merged; a reference without any ranges covers its whole chapter.
+    """
+
+    raw: str
+    book: str
+    chapter: int | None
+    ranges: tuple[VerseRange, ...]
+
+    def __str__(self):
+        return self.raw
+
+    @property
+    def is_psalm(self) -> bool:
+        return self.book == "Psalm"
+
+    def verse_ranges(self) -> list[tuple[int, int]]:
+        """Return the (start, end) verse ranges of a reference which lies
+        within a single chapter.
+        """
+
+        verse_ranges = []
+        for r in self.ranges:
+            if r.start_chapter != self.chapter or r.end_chapter != self.chapter:
+                raise ValueError(f"{self.raw} spans more than one chapter")
+            verse_ranges.append((r.start_verse, r.end_verse))
+        return verse_ranges
+
+    def verse_nums(self) -> list[int]:
+        verse_nums = []
+        for start, end in self.verse_ranges():
+            verse_nums.extend(range(start, end + 1))
+        return verse_nums
+
+
+def _compress(ranges: list[VerseRange]) -> tuple[VerseRange, ...]:
+    compressed = []
+    for r in ranges:
+        if compressed:
+            prev = compressed[-1]
+            if (
+                r.start_chapter == prev.end_chapter
+                and prev.start_verse <= r.start_verse <= prev.end_verse + 1
+                and r.start_chapter == prev.start_chapter
+            ):
+                end = max((prev.end_chapter, prev.end_verse), r[2:])
+                compressed[-1] = VerseRange(prev.start_chapter, prev.start_verse, *end)
+                continue
+        compressed.append(r)
+    return tuple(compressed)
+
+
+@lru_cache(maxsize=4096)
+def parse_reference(reference: str) -> Reference:
+    """Parse a single reference (without alternatives) into its book,
+    chapter, and verse ranges. Optional verses in parentheses are treated
+    like any other verses.
+    """
+
+    match = BOOK_RE.match(long_reference(reference))
+    if not match:
+        raise ValueError(f"Could not parse reference {reference!r}")
+    book = match[1]
+    rest = match.string[match.end() :]
+
+    has_verses = ":" in rest or book in SINGLE_CHAPTER_BOOKS
+    first_chapter = chapter = 1 if book in SINGLE_CHAPTER_BOOKS else None
+    ranges = []
+    for item in SEPARATOR_RE.split(rest):
+        item = item.strip()
+        if not item:
+            continue
+
+        match = RANGE_RE.fullmatch(item)
+        if not match:
+            raise ValueError(f"Could not parse reference {reference!r}")
+        start_chapter, start_verse, end_chapter, end_verse = match.groups()
+
+        if not has_verses:
+            if end_verse is not None or chapter is not None:
+                raise ValueError(f"Could not parse reference {reference!r}")
+            first_chapter = chapter = int(start_verse)
+            continue
+
+        if start_chapter is not None:
+            chapter = int(start_chapter)
+        if chapter is None:
+            raise ValueError(f"Could not parse reference {reference!r}")
+        if first_chapter is None:
+            first_chapter = chapter
+
+        start_verse = int(start_verse)
+        end_verse = int(end_verse) if end_verse is not None else start_verse
+        if end_chapter is not None:
+            ranges.append(VerseRange(chapter, start_verse, int(end_chapter), end_verse))
+            chapter = int(end_chapter)
+        else:
+            ranges.append(VerseRange(chapter, start_verse, chapter, end_verse))
+
+    return Reference(reference, book, first_chapter, _compress(ranges))
+
+
+@lru_cache(maxsize=4096)
+def parse_lesson(reference: str) -> tuple[Reference, ...]:
+    """Parse a lesson, which may have alternate readings separated by
+    " or ", into a tuple of references. An alternate without a book, e.g.
+    "Isaiah 40:1-11 or 40:1-5", is in the book of the one before it.
+    """
+
+    references = []
+    for alt in reference.split(" or "):
+        alt = alt.strip()
+        if references and not BOOK_RE.match(alt):
+            alt = f"{references[-1].book} {alt}"
+        references.append(parse_reference(alt))
+    return tuple(references)
+
+
+@lru_cache(maxsize=4096)
+def long_reference(reference: str) -> str:
+    """Return the reference with its optional verses included."""
+
+    # An opening parenthesis after a number begins a new list of verses,
+    # e.g. "Psalm 33(1-9), 10-21" or "Psalm 23:1-3 (4-6)".
+    chars = []
+    for i, char in enumerate(reference):
+        if char == "(" and reference[:i].rstrip()[-1:].isdigit():
+            passage = ALTERNATIVE_RE.split(reference[:i])[-1]
+            chars.append("," if ":" in passage else ":")
+        chars.append(char)
+
+    text = PARENS_RE.sub(" ", "".join(chars))
+    text = SPACING_RE.sub(lambda m: m[1] if m[1] == ":" else f"{m[1]} ", text)
+    return WHITESPACE_RE.sub(" ", text).strip()
+
+
+@lru_cache(maxsize=4096)
+def short_reference(reference: str) -> str:
+    """Return the reference with its optional verses left out."""
+
+    return OPTIONAL_RE.sub("", reference)
@@ -0,0 +1,124 @@
+"""Helpers for calling an upstream service which is sometimes slow or down,
+without letting its incidents hold up every request that depends on it.
+"""
+
+import asyncio
+import random
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from functools import partial
+
+
+def backoff(attempt: int, base: float, cap: float) -> float:
+    """Return a random delay before retry number `attempt` (from 0), which
+    grows exponentially up to `cap` ("full jitter"), so that clients which
+    failed together do not all retry together.
+    """
+
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+class CircuitBreaker:
+    """Stop calling a service once `threshold` calls in a row have failed.
+
+    While the circuit is open, calls are refused without touching the
+    service. After `reset_timeout` seconds a single trial call is let
+    through: the circuit closes again if it succeeds, and stays open for
+    another `reset_timeout` seconds if it fails.
+    """
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self.opened_at < self.reset_timeout:
+                return False
+            # Let this call through, and hold back the rest until it is done
+            # (or for another period, should it never report back)
+            self.opened_at = now
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class SingleFlight:
+    """Coalesce concurrent calls between threads: while a call for a key is
+    in progress, other threads asking for the same key wait for its result
+    rather than making the same call again.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, func, *args):
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = self.calls[key] = Future()
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = func(*args)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+
+class AsyncSingleFlight:
+    """Like SingleFlight, but for coroutines sharing an event loop."""
+
+    def __init__(self):
+        # Tasks belong to the loop they were created in
+        self.calls = weakref.WeakKeyDictionary()
+
+    async def do(self, key, func, *args):
+        loop = asyncio.get_running_loop()
+        calls = self.calls.setdefault(loop, {})
+        task = calls.get(key)
+        if task is None:
+            task = calls[key] = loop.create_task(func(*args))
+            task.add_done_callback(partial(self._done, calls, key))
+        # A caller which goes away (say, a client disconnecting) must not
+        # cancel the call for everyone else waiting on it
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def _done(calls, key, task):
+        if calls.get(key) is task:
+            del calls[key]
+        # Every waiter may have gone, so mark the exception as retrieved
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,24 @@
+// Fill in the lessons which were queued to be fetched once they are ready.
+const MAX_POLLS = 30;
+
+document.querySelectorAll("[data-poll-url]").forEach((element) => {
+    poll(element, 0);
+});
+
+async function poll(element, count) {
+    try {
+        const response = await fetch(element.dataset.pollUrl);
+        const lesson = await response.json();
+        if (lesson.status !== "pending") {
+            element.innerHTML = lesson.html;
+            lessonTexts[element.dataset.index] = lesson.text;
+            texts = lessonTexts.join("\n");
+            return;
+        }
+    } catch (error) {
+        console.error(error.message);
+    }
+    if (count < MAX_POLLS) {
+        setTimeout(() => poll(element, count + 1), pollInterval);
+    }
+}
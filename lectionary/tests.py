@@ -1,8 +1,73 @@
-from django.test import TestCase
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
 
+import asyncio
 import datetime as dt
+import json
+import tempfile
+import threading
+import time
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-from lectionary.services.lectionary import Lectionary
+import httpx
+import requests
+from asgiref.sync import async_to_sync
+from prometheus_client import REGISTRY
+
+from lectionary.models import (
+    CalendarEntry,
+    Day,
+    DayCollect,
+    DayLesson,
+    FetchJob,
+    Lesson,
+)
+from lectionary.services.bible import BibleIndex, write_bible_index
+from lectionary.services.calendar import (
+    build_calendar,
+    build_fragments,
+    get_data_version,
+    iter_calendar,
+)
+from lectionary.services.ics import escape_text, fold_line
+from lectionary.services.jobs import MAX_ATTEMPTS as MAX_JOB_ATTEMPTS
+from lectionary.services.lectionary import (
+    Lectionary,
+    get_liturgical_year,
+    get_moveable_dates,
+)
+from lectionary.services.reference import (
+    VerseRange,
+    long_reference,
+    parse_lesson,
+    parse_reference,
+    short_reference,
+)
+from lectionary.services.scripture import (
+    ESV_HTML_URL,
+    MAX_ATTEMPTS,
+    PENDING_HTML,
+    PLACEHOLDER_HTML,
+    RETRY_AFTER,
+    ESVError,
+    ESVRateLimitError,
+    ESVUnavailableError,
+    aget_esv_passage,
+    LocalProvider,
+    breaker,
+    get_async_client,
+    get_esv_passage,
+    get_provider,
+    html_to_text,
+)
+from psalter.models import Psalm, Verse
 
 
 class MoveableDatesTestCase(TestCase):
@@ -41,3 +106,1425 @@ class MoveableDatesTestCase(TestCase):
             "advent_sunday": dt.date(2024, 12, 1),
         }
         self.assertEqual(lectionary.moveable, expect)
+
+
+class LiturgicalYearTestCase(TestCase):
+    def test_year_bounds(self):
+        """A church year runs from one Advent Sunday to the next."""
+
+        year = get_liturgical_year(2024)
+        self.assertEqual(year.start, dt.date(2024, 12, 1))
+        self.assertEqual(year.end, dt.date(2025, 11, 30))
+        self.assertEqual(year.letter, "C")
+        self.assertIn(dt.date(2025, 11, 29), year)
+        self.assertNotIn(dt.date(2025, 11, 30), year)
+
+    def test_names(self):
+        """Named days are found within the year table."""
+
+        lectionary = Lectionary(dt.date(2025, 4, 20))
+        self.assertEqual(lectionary.names, ["Easter Day"])
+        self.assertEqual(lectionary.season, "Easter")
+        self.assertEqual(lectionary.year, "C")
+
+        lectionary = Lectionary(dt.date(2025, 3, 2))
+        self.assertEqual(lectionary.names, ["Last Sunday after Epiphany"])
+
+        lectionary = Lectionary(dt.date(2025, 7, 13))
+        self.assertEqual(lectionary.names, ["Proper 10"])
+        self.assertEqual(lectionary.season, "Pentecost")
+
+        lectionary = Lectionary(dt.date(2025, 11, 30))
+        self.assertEqual(lectionary.names, ["First Sunday of Advent", "Saint Andrew"])
+        self.assertEqual(lectionary.year, "A")
+
+    def test_christmas_on_sunday(self):
+        """When Christmas Day is a Sunday, the next Sunday is the first
+        Sunday after Christmas.
+        """
+
+        self.assertEqual(Lectionary(dt.date(2022, 12, 25)).names, ["Christmas Day"])
+        self.assertEqual(
+            Lectionary(dt.date(2023, 1, 1)).names,
+            ["First Sunday after Christmas", "Holy Name"],
+        )
+
+    def test_fixed_date_twice(self):
+        """A fixed date may fall twice within a long church year."""
+
+        year = get_liturgical_year(2027)
+        self.assertEqual(year.start, dt.date(2027, 11, 28))
+        self.assertEqual(year.end, dt.date(2028, 12, 3))
+        self.assertIn("Saint Andrew", year[dt.date(2027, 11, 30)].names)
+        self.assertIn("Saint Andrew", year[dt.date(2028, 11, 30)].names)
+
+    def test_resolve_range(self):
+        """Resolving a range matches resolving each date on its own."""
+
+        start = dt.date(2024, 11, 1)
+        end = dt.date(2026, 1, 31)
+        days = Lectionary.resolve_range(start, end)
+        self.assertEqual(len(days), (end - start).days + 1)
+        self.assertEqual(days[0].date, start)
+        self.assertEqual(days[-1].date, end)
+        for day in days:
+            lectionary = Lectionary(day.date)
+            self.assertEqual(list(day.names), lectionary.names)
+            self.assertEqual(day.season, lectionary.season)
+            self.assertEqual(day.year, lectionary.year)
+
+        self.assertEqual(Lectionary.resolve_range(end, start), [])
+
+    def test_edge_years(self):
+        """The church years which begin in 0 and 9999 are cut short at the
+        first and last dates which can be represented.
+        """
+
+        for year in range(1, 2000):
+            self.assertEqual(
+                get_liturgical_year(year).start,
+                get_moveable_dates(year)["advent_sunday"],
+            )
+
+        year = get_liturgical_year(0)
+        self.assertEqual(year.start, dt.date.min)
+        self.assertEqual(year.end, dt.date(1, 12, 2))
+        self.assertEqual(Lectionary(dt.date.min).names, ["Holy Name"])
+
+        year = get_liturgical_year(9999)
+        self.assertEqual(year.start, dt.date(9999, 11, 28))
+        self.assertIsNone(year.end)
+        self.assertIn(dt.date.max, year)
+        self.assertEqual(Lectionary(dt.date.max).season, "Christmas")
+
+        days = Lectionary.resolve_range(dt.date(9999, 1, 1), dt.date.max)
+        self.assertEqual(len(days), 365)
+
+        for start in ("0001-01-01", "9999-12-20"):
+            response = self.client.get(reverse("index"), {"start": start})
+            self.assertEqual(response.status_code, 200)
+
+
+LOCMEM_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {"MAX_ENTRIES": 50000},
+    }
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CalendarTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_long_ranges(self):
+        """Long ranges are not cached, and too long ones aren't served."""
+
+        with mock.patch.object(cache, "set_many") as set_many:
+            calendar = build_calendar(dt.date(2024, 1, 1), dt.date(2025, 12, 31))
+        self.assertTrue(calendar)
+        set_many.assert_not_called()
+
+        with self.assertLogs("django.request", "WARNING"):
+            response = self.client.get(
+                "/", {"start": "0001-01-01", "end": "9999-12-31"}
+            )
+        self.assertEqual(response.status_code, 400)
+
+    def test_build_calendar(self):
+        """Calendar entries match the days and lessons in the database."""
+
+        start = dt.date(2024, 12, 1)
+        end = dt.date(2025, 1, 31)
+        calendar = build_calendar(start, end)
+
+        entries = calendar["Sunday, 12/01/24"]
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]["day"]["name"], "First Sunday of Advent")
+        self.assertEqual(entries[0]["year"], "C")
+        self.assertEqual(entries[0]["season"], "Advent")
+
+        for entries in calendar.values():
+            for entry in entries:
+                day = Day.objects.get(pk=entry["day"]["url"].strip("/"))
+                expect = [
+                    d.lesson.reference
+                    for d in DayLesson.objects.filter(day=day).order_by("pk")
+                ]
+                self.assertEqual(entry["lessons"], expect)
+
+    def test_build_calendar_queries(self):
+        """Building a calendar takes a constant number of queries, and
+        none at all once every date is cached.
+        """
+
+        with self.assertNumQueries(1):
+            build_calendar(dt.date(2024, 1, 1), dt.date(2024, 12, 31))
+        with self.assertNumQueries(0):
+            build_calendar(dt.date(2024, 1, 1), dt.date(2024, 12, 31))
+
+    def test_calendar_entries(self):
+        """Every day has a calendar entry matching its data, which follows
+        the day when it is saved.
+        """
+
+        self.assertEqual(CalendarEntry.objects.count(), Day.objects.count())
+        day = Day.objects.get(name="First Sunday of Advent", year="A")
+        self.assertEqual(
+            day.calendar_entry.data,
+            {
+                "day": {
+                    "name": day.name,
+                    "service": None,
+                    "color": day.color,
+                    "url": day.get_absolute_url(),
+                },
+                "lessons": [
+                    lesson.reference for lesson in day.lessons.order_by("daylesson")
+                ],
+                "collects": [
+                    collect.text for collect in day.collects.order_by("daycollect")
+                ],
+            },
+        )
+
+        day.color = Day.Color.VIOLET
+        with self.captureOnCommitCallbacks(execute=True):
+            day.save()
+        entry = CalendarEntry.objects.get(day=day)
+        self.assertEqual(entry.data["day"]["color"], "violet")
+        calendar = build_calendar(dt.date(2025, 11, 30), dt.date(2025, 11, 30))
+        self.assertEqual(list(calendar.values())[0][0]["day"]["color"], "violet")
+
+    def test_changes_committed(self):
+        """Entries are rebuilt, and the data version bumped after them, only
+        once changes to days, their lessons or their collects are committed.
+        """
+
+        day = Day.objects.get(name="First Sunday of Advent", year="A")
+        version = get_data_version()
+        with self.captureOnCommitCallbacks() as callbacks:
+            day.color = Day.Color.GREEN
+            day.save()
+            self.assertEqual(
+                CalendarEntry.objects.get(day=day).data["day"]["color"], "blue"
+            )
+        self.assertEqual(get_data_version(), version)
+        with mock.patch(
+            "lectionary.services.calendar.bump_data_version",
+            side_effect=lambda: self.assertEqual(
+                CalendarEntry.objects.get(day=day).data["day"]["color"], "green"
+            ),
+        ) as bump:
+            for callback in callbacks:
+                callback()
+        bump.assert_called_once()
+
+        def entry():
+            return CalendarEntry.objects.get(day=day).data
+
+        lesson = Lesson.objects.create(reference="John 1:1-5")
+        with self.captureOnCommitCallbacks(execute=True):
+            DayLesson.objects.create(day=day, lesson=lesson)
+        self.assertEqual(entry()["lessons"][-1], "John 1:1-5")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson.reference = "John 1:1-14"
+            lesson.save()
+        self.assertEqual(entry()["lessons"][-1], "John 1:1-14")
+
+        # Caching a lesson's passage doesn't touch the calendar
+        with self.captureOnCommitCallbacks() as callbacks:
+            lesson.set_content("<p>html</p>", "text")
+            lesson.save(update_fields=Lesson.CONTENT_FIELDS)
+        self.assertEqual(callbacks, [])
+
+        collect = day.collects.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            collect.text = "Almighty God, amen."
+            collect.save()
+        self.assertEqual(entry()["collects"], ["Almighty God, amen."])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson.delete()
+        self.assertNotIn("John 1:1-14", entry()["lessons"])
+
+    def test_migrate_without_cache_table(self):
+        """Migrating works before the table of a DatabaseCache exists."""
+
+        caches = {
+            "default": {
+                "BACKEND": "website.cache.TieredCache",
+                "LOCATION": "migrate-test",
+                "OPTIONS": {"SHARED": "shared"},
+            },
+            "shared": {
+                "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+                "LOCATION": "missing_cache_table",
+            },
+        }
+        with override_settings(CACHES=caches):
+            call_command("migrate", verbosity=0, interactive=False)
+        self.assertEqual(CalendarEntry.objects.count(), Day.objects.count())
+
+    def test_overlapping_ranges(self):
+        """Overlapping ranges share cached dates, and only build the rest."""
+
+        first = build_calendar(dt.date(2024, 12, 1), dt.date(2024, 12, 31))
+        with mock.patch(
+            "lectionary.services.calendar.build_fragments", wraps=build_fragments
+        ) as build:
+            second = build_calendar(dt.date(2024, 12, 15), dt.date(2025, 1, 14))
+        build.assert_called_once_with(
+            [dt.date(2025, 1, 1) + dt.timedelta(days=i) for i in range(14)]
+        )
+        self.assertEqual(second["Sunday, 12/15/24"], first["Sunday, 12/15/24"])
+        self.assertEqual(
+            second, build_calendar(dt.date(2024, 12, 15), dt.date(2025, 1, 14))
+        )
+
+    def test_data_version(self):
+        """Changing a day invalidates every cached date."""
+
+        version = get_data_version()
+        calendar = build_calendar(dt.date(2024, 12, 1), dt.date(2024, 12, 1))
+        day = Day.objects.get(name="First Sunday of Advent", year="C")
+        day.color = Day.Color.GREEN
+        with self.captureOnCommitCallbacks(execute=True):
+            day.save()
+
+        self.assertNotEqual(get_data_version(), version)
+        new_calendar = build_calendar(dt.date(2024, 12, 1), dt.date(2024, 12, 1))
+        self.assertNotEqual(calendar, new_calendar)
+        self.assertEqual(new_calendar["Sunday, 12/01/24"][0]["day"]["color"], "green")
+
+
+def get_streamed(client, path, data=None, **extra):
+    """Request a streaming view through the async client, as it is served
+    under ASGI, returning the response and the content read from it.
+    """
+
+    async def get():
+        response = await client.get(path, data, **extra)
+        if not response.streaming:
+            return response, response.content
+        return response, b"".join([chunk async for chunk in response.streaming_content])
+
+    return async_to_sync(get)()
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CalendarAPITestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_calendar(self):
+        """The API returns the same days as the calendar page."""
+
+        response, content = get_streamed(
+            self.async_client,
+            "/api/v1/calendar/",
+            {"start": "2024-12-01", "end": "2025-01-31"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        data = json.loads(content)
+        self.assertEqual(data["start"], "2024-12-01")
+        self.assertEqual(data["end"], "2025-01-31")
+
+        calendar = build_calendar(dt.date(2024, 12, 1), dt.date(2025, 1, 31))
+        self.assertEqual(len(data["days"]), len(calendar))
+        first = data["days"][0]
+        self.assertEqual(first["date"], "2024-12-01")
+        self.assertEqual(
+            first["entries"][0],
+            {
+                "name": "First Sunday of Advent",
+                "service": None,
+                "color": "blue",
+                "season": "Advent",
+                "year": "C",
+                "lessons": calendar["Sunday, 12/01/24"][0]["lessons"],
+                "url": calendar["Sunday, 12/01/24"][0]["day"]["url"],
+            },
+        )
+
+    def test_iter_calendar(self):
+        """Ranges are loaded a chunk at a time, and long ranges are not
+        cached.
+        """
+
+        start = dt.date(2023, 6, 4)
+        end = dt.date(2025, 6, 1)
+        with mock.patch(
+            "lectionary.services.calendar.build_fragments", wraps=build_fragments
+        ) as build:
+            days = list(iter_calendar(start, end, chunk_days=30))
+        self.assertEqual(build.call_count, 25)
+        self.assertEqual(
+            {date.strftime("%A, %D"): entries for date, entries in days},
+            build_calendar(start, end),
+        )
+
+        cache.clear()
+        list(iter_calendar(start, end, chunk_days=30))
+        with self.assertNumQueries(1):
+            list(iter_calendar(start, start))
+
+    def test_end_of_calendar(self):
+        """Ranges running up to date.max are streamed in full."""
+
+        response, content = get_streamed(
+            self.async_client,
+            "/api/v1/calendar/",
+            {"start": "9999-12-01", "end": "9999-12-31"},
+        )
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(content)
+        self.assertEqual(data["end"], "9999-12-31")
+
+        calendar = build_calendar(dt.date(9999, 12, 1), dt.date.max)
+        self.assertEqual(len(data["days"]), len(calendar))
+        days = list(iter_calendar(dt.date(9999, 12, 1), dt.date.max, chunk_days=7))
+        self.assertEqual(len(days), len(calendar))
+
+    def test_conditional(self):
+        url = "/api/v1/calendar/?start=2024-12-01&end=2024-12-31"
+        etag = get_streamed(self.async_client, url)[0]["ETag"]
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_invalid_ranges(self):
+        for params in (
+            {"start": "2024-13-01"},
+            {"start": "2024-12-01", "end": "2024-11-30"},
+            {"start": "1900-01-01", "end": "2100-01-01"},
+        ):
+            with self.assertLogs("django.request", "WARNING"):
+                response = self.client.get("/api/v1/calendar/", params)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("error", response.json())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ICSTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_escape_text(self):
+        self.assertEqual(
+            escape_text("Psalm 63:1-9, (10-12); a\\b\nc"),
+            "Psalm 63:1-9\\, (10-12)\\; a\\\\b\\nc",
+        )
+
+    def test_fold_line(self):
+        """Long lines are folded at 75 octets, between characters."""
+
+        self.assertEqual(fold_line("SUMMARY:Short"), "SUMMARY:Short\r\n")
+
+        line = "DESCRIPTION:" + "Advent — Year C " * 20
+        folded = fold_line(line)
+        self.assertTrue(folded.endswith("\r\n"))
+        for part in folded[:-2].split("\r\n"):
+            self.assertLessEqual(len(part.encode()), 75)
+        self.assertEqual(folded[:-2].replace("\r\n ", ""), line)
+
+    def test_feed(self):
+        """The feed has an event for every calendar entry in its years."""
+
+        response, content = get_streamed(
+            self.async_client, "/calendar.ics", {"start": 2024, "end": 2025}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        self.assertEqual(response["Content-Type"], "text/calendar; charset=utf-8")
+        body = content.decode()
+
+        self.assertTrue(body.startswith("BEGIN:VCALENDAR\r\n"))
+        self.assertTrue(body.endswith("END:VCALENDAR\r\n"))
+        calendar = build_calendar(dt.date(2024, 1, 1), dt.date(2025, 12, 31))
+        entries = sum(len(entries) for entries in calendar.values())
+        self.assertEqual(body.count("BEGIN:VEVENT"), entries)
+        self.assertIn("DTSTART;VALUE=DATE:20241201\r\n", body)
+        self.assertIn("SUMMARY:First Sunday of Advent\r\n", body)
+
+        uids = [line for line in body.split("\r\n") if line.startswith("UID:")]
+        self.assertEqual(len(uids), len(set(uids)))
+
+    def test_cached_years(self):
+        """Each year's events are cached, and clients revalidate cheaply."""
+
+        url = "/calendar.ics?start=2024&end=2025"
+        body = get_streamed(self.async_client, url)[1]
+
+        with self.assertNumQueries(0):
+            response, content = get_streamed(self.async_client, url)
+            self.assertEqual(content, body)
+
+            response = self.client.get(url, headers={"If-None-Match": response["ETag"]})
+            self.assertEqual(response.status_code, 304)
+
+    def test_edge_years(self):
+        """The first and last years of the feed are complete."""
+
+        for year in (1, 9998):
+            response, content = get_streamed(
+                self.async_client, "/calendar.ics", {"start": year, "end": year}
+            )
+            self.assertEqual(response.status_code, 200)
+            body = content.decode()
+            self.assertIn(f"DTSTART;VALUE=DATE:{year:04}01", body)
+            self.assertIn(f"DTSTART;VALUE=DATE:{year:04}12", body)
+            self.assertTrue(body.endswith("END:VCALENDAR\r\n"))
+
+    def test_invalid_years(self):
+        for params in (
+            {"start": "soon"},
+            {"start": 2030, "end": 2020},
+            {"start": 0, "end": 1},
+            {"start": 9998, "end": 9999},
+        ):
+            with self.assertLogs("django.request", "WARNING"):
+                response = self.client.get("/calendar.ics", params)
+            self.assertEqual(response.status_code, 400)
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, url, params):
+        self.url = url
+        self.params = params
+
+    def json(self):
+        reference = self.params["q"]
+        return {
+            "canonical": reference,
+            "passages": [f"<p><b class='verse-num'>1&nbsp;</b>{reference}</p>"],
+        }
+
+
+class FakeESV:
+    """Stands in for the ESV API behind the async client."""
+
+    def __init__(self, passages=True, status=200):
+        self.passages = passages
+        self.status = status
+        self.requests = []
+
+    def __call__(self, request):
+        self.requests.append(request)
+        if self.status != 200:
+            return httpx.Response(self.status, text="<html>Bad Gateway</html>")
+        reference = request.url.params["q"]
+        passages = []
+        if self.passages:
+            passages = [f"<p><b class='verse-num'>1&nbsp;</b>{reference}</p>"]
+        return httpx.Response(200, json={"canonical": reference, "passages": passages})
+
+    def client(self):
+        return httpx.AsyncClient(transport=httpx.MockTransport(self))
+
+
+@mock.patch("lectionary.services.scripture.session")
+class LessonCacheTestCase(TestCase):
+    async def test_acache_all(self, session):
+        """Missing ESV passages are fetched with the async client."""
+
+        esv = FakeESV()
+        day = await Day.objects.filter(name="First Sunday of Advent", year="A").afirst()
+        lessons = [lesson async for lesson in day.lessons.all()]
+        with mock.patch("lectionary.services.scripture.get_async_client", esv.client):
+            await Lesson.acache_all(lessons)
+            await Lesson.acache_all(lessons)
+
+        self.assertEqual(len(esv.requests), 3)
+        session.get.assert_not_called()
+        pks = [lesson.pk for lesson in lessons]
+        async for lesson in Lesson.objects.filter(pk__in=pks):
+            self.assertTrue(lesson.html)
+            if not lesson.is_psalm:
+                self.assertEqual(
+                    lesson.text, f"{lesson.reference}\n\n1 {lesson.reference}\n"
+                )
+
+    async def test_stale_content(self, session):
+        """Content which is out of date is still served rather than
+        fetched again, except for psalms, which are re-rendered.
+        """
+
+        esv = FakeESV()
+        day = await Day.objects.filter(name="First Sunday of Advent", year="A").afirst()
+        with mock.patch("lectionary.services.scripture.get_async_client", esv.client):
+            await Lesson.acache_all([lesson async for lesson in day.lessons.all()])
+            async for lesson in day.lessons.all():
+                self.assertFalse(lesson.is_stale())
+
+            with (
+                mock.patch("lectionary.services.scripture.ESV_FORMAT", 2),
+                mock.patch("lectionary.models.PSALTER_VERSION", "psalter:2"),
+            ):
+                lessons = [lesson async for lesson in day.lessons.all()]
+                self.assertTrue(all(lesson.is_stale() for lesson in lessons))
+                await Lesson.acache_all(lessons)
+                self.assertEqual(len(esv.requests), 3)
+                async for lesson in day.lessons.all():
+                    self.assertTrue(lesson.is_cached)
+                    self.assertEqual(lesson.is_stale(), not lesson.is_psalm)
+
+    def test_invalidate(self, session):
+        """Invalidated lessons are stale, but keep their content."""
+
+        lesson = Lesson.objects.exclude(reference__startswith="Psalm").first()
+        lesson.set_content("<p>html</p>", "text")
+        lesson.save()
+        self.assertFalse(lesson.is_stale())
+        self.assertTrue(lesson.is_stale(max_age=dt.timedelta(0)))
+
+        Lesson.objects.filter(pk=lesson.pk).invalidate()
+        lesson.refresh_from_db()
+        self.assertTrue(lesson.is_stale())
+        self.assertEqual(lesson.html, "<p>html</p>")
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ConditionalViewTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_index(self):
+        """A known range is revalidated without building the calendar."""
+
+        url = "/?start=2024-12-01&end=2024-12-31"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("max-age=86400", response["Cache-Control"])
+        etag = response["ETag"]
+        self.assertFalse(etag.startswith("W/"))
+
+        with self.assertNumQueries(0), self.assertTemplateNotUsed(
+            "lectionary/index.html"
+        ):
+            response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+        response = self.client.get("/?start=2024-12-01&end=2025-01-31")
+        self.assertNotEqual(response["ETag"], etag)
+
+        response = self.client.get("/")
+        self.assertIn("max-age=300", response["Cache-Control"])
+
+    def test_index_data_version(self):
+        """Changing the data changes the ETag of every range."""
+
+        url = "/?start=2024-12-01&end=2024-12-31"
+        etag = self.client.get(url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Day.objects.first().save()
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_detail(self):
+        """A day with cached lessons is revalidated without fetching or
+        rendering anything.
+        """
+
+        esv = FakeESV()
+        day = Day.objects.filter(name="First Sunday of Advent", year="A").first()
+        with mock.patch("lectionary.services.scripture.get_async_client", esv.client):
+            response = self.client.get(day.get_absolute_url())
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("max-age=86400", response["Cache-Control"])
+            self.assertEqual(len(esv.requests), 3)
+            self.assertIn("esv;dur=", response["Server-Timing"])
+            self.assertContains(response, "Crossway")
+            etag = response["ETag"]
+
+            with self.assertTemplateNotUsed("lectionary/detail.html"):
+                response = self.client.get(
+                    day.get_absolute_url(), headers={"If-None-Match": etag}
+                )
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(len(esv.requests), 3)
+
+        lesson = day.lessons.exclude(reference__startswith="Psalm").first()
+        lesson.text = "Changed"
+        lesson.save()
+        response = self.client.get(
+            day.get_absolute_url(), headers={"If-None-Match": etag}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_detail_uncached(self):
+        """Pages with lessons which could not be fetched are not cached."""
+
+        esv = FakeESV(passages=False)
+        day = Day.objects.filter(name="First Sunday of Advent", year="A").first()
+        with mock.patch("lectionary.services.scripture.get_async_client", esv.client):
+            response = self.client.get(day.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("ETag", response)
+        self.assertIn("no-cache", response["Cache-Control"])
+
+    @mock.patch("lectionary.services.scripture.backoff", return_value=0)
+    def test_detail_unavailable(self, backoff):
+        """Pages are still served while the ESV API is down, with a
+        placeholder in place of each passage which could not be fetched.
+        """
+
+        self.addCleanup(breaker.reset)
+        esv = FakeESV(status=502)
+        day = Day.objects.filter(name="First Sunday of Advent", year="A").first()
+        with mock.patch("lectionary.services.scripture.get_async_client", esv.client):
+            response = self.client.get(day.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, PLACEHOLDER_HTML, count=3, html=True)
+        self.assertIn("psalm-verse", response.content.decode())
+        self.assertIn("no-cache", response["Cache-Control"])
+        self.assertFalse(
+            day.lessons.filter(html__isnull=False)
+            .exclude(reference__startswith="Psalm")
+            .exists()
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LESSON_FETCH={"MODE": "queue"})
+@mock.patch("lectionary.services.scripture.session")
+class FetchQueueTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(breaker.reset)
+        self.day = Day.objects.filter(name="First Sunday of Advent", year="A").first()
+        self.lessons = self.day.lessons.exclude(reference__startswith="Psalm")
+
+    def fetch_lessons(self):
+        call_command(
+            "fetch_lessons", "--once", "--rate=0", stdout=StringIO(), stderr=StringIO()
+        )
+
+    def test_queued_detail(self, session):
+        """Pages queue the lessons which are not cached yet rather than
+        fetching them, and are filled in once the worker has fetched them.
+        """
+
+        session.get.side_effect = lambda url, params, **kwargs: FakeResponse(
+            url, params
+        )
+        response = self.client.get(self.day.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        session.get.assert_not_called()
+        self.assertContains(response, PENDING_HTML, count=3, html=True)
+        self.assertContains(response, "data-poll-url", count=3)
+        self.assertIn("psalm-verse", response.content.decode())
+        self.assertIn("no-cache", response["Cache-Control"])
+        self.assertEqual(FetchJob.objects.count(), 3)
+
+        # Visiting again doesn't queue the lessons twice
+        self.client.get(self.day.get_absolute_url())
+        self.assertEqual(FetchJob.objects.count(), 3)
+
+        lesson = self.lessons.first()
+        url = reverse("api_lesson", kwargs={"pk": lesson.pk})
+        self.assertEqual(self.client.get(url).json()["status"], "pending")
+
+        self.fetch_lessons()
+        self.assertEqual(session.get.call_count, 3)
+        self.assertFalse(FetchJob.objects.exists())
+        data = self.client.get(url).json()
+        self.assertEqual(data["status"], "ready")
+        self.assertIn(lesson.reference, data["html"])
+
+        response = self.client.get(self.day.get_absolute_url())
+        self.assertNotContains(response, "data-poll-url")
+        self.assertIn("ETag", response)
+
+    def test_stale_lessons_queued(self, session):
+        """Lessons which are out of date are served as they are, and queued
+        to be refreshed.
+        """
+
+        for lesson in self.lessons:
+            lesson.set_content("<p>old</p>", "old")
+            lesson.save()
+        self.lessons.invalidate()
+
+        response = self.client.get(self.day.get_absolute_url())
+        self.assertContains(response, "<p>old</p>", count=3, html=True)
+        self.assertNotContains(response, "data-poll-url")
+        self.assertEqual(FetchJob.objects.count(), 3)
+
+    @mock.patch("lectionary.services.jobs.backoff", return_value=60)
+    def test_worker_retries(self, backoff, session):
+        """Failed jobs are tried again later, and given up after too many
+        attempts.
+        """
+
+        session.get.return_value = mock.Mock(status_code=400, headers={})
+        lesson = self.lessons.first()
+        FetchJob.enqueue([lesson])
+
+        self.fetch_lessons()
+        job = FetchJob.objects.get(lesson=lesson)
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertTrue(job.last_error)
+
+        # Not due yet
+        self.fetch_lessons()
+        self.assertEqual(session.get.call_count, 1)
+
+        job.attempts = MAX_JOB_ATTEMPTS - 1
+        job.run_after = timezone.now()
+        job.save()
+        with self.assertLogs("django", "ERROR"):
+            self.fetch_lessons()
+        self.assertFalse(FetchJob.objects.exists())
+        url = reverse("api_lesson", kwargs={"pk": lesson.pk})
+        data = self.client.get(url).json()
+        self.assertEqual(data["status"], "failed")
+        self.assertEqual(data["html"], PLACEHOLDER_HTML)
+
+    def test_claim(self, session):
+        """Claimed jobs are leased, and aren't claimed again until the lease
+        is over.
+        """
+
+        FetchJob.enqueue(list(self.lessons))
+        jobs = FetchJob.objects.claim(2, dt.timedelta(minutes=5))
+        self.assertEqual(len(jobs), 2)
+        self.assertEqual(len(FetchJob.objects.claim(5, dt.timedelta(minutes=5))), 1)
+        self.assertEqual(FetchJob.objects.claim(5, dt.timedelta(minutes=5)), [])
+        FetchJob.objects.update(run_after=timezone.now())
+        self.assertEqual(len(FetchJob.objects.claim(5, dt.timedelta(0))), 3)
+
+
+@mock.patch("lectionary.services.scripture.backoff", return_value=0)
+@mock.patch("lectionary.services.scripture.session")
+class ScriptureClientTestCase(SimpleTestCase):
+    def setUp(self):
+        breaker.reset()
+        self.addCleanup(breaker.reset)
+
+    def error_response(self, status, headers=None):
+        response = mock.Mock(status_code=status, headers=headers or {})
+        response.json.side_effect = requests.exceptions.JSONDecodeError("", "", 0)
+        return response
+
+    def test_retries(self, session, backoff):
+        """Transient failures are retried."""
+
+        session.get.side_effect = [
+            requests.ConnectionError(),
+            self.error_response(503),
+            FakeResponse(ESV_HTML_URL, {"q": "John 1:1"}),
+        ]
+        html, text = get_esv_passage("John 1:1")
+        self.assertIn("John 1:1", html)
+        self.assertEqual(session.get.call_count, 3)
+        connect, read = session.get.call_args.kwargs["timeout"]
+        self.assertLess(connect, read)
+
+    def test_gives_up(self, session, backoff):
+        """Retries are bounded, and errors which would only happen again
+        are not retried at all.
+        """
+
+        timeouts = REGISTRY.get_sample_value(
+            "lectionary_esv_errors_total", {"kind": "timeout"}
+        )
+        session.get.side_effect = requests.Timeout()
+        with self.assertRaises(ESVError):
+            get_esv_passage("John 1:1")
+        self.assertEqual(session.get.call_count, MAX_ATTEMPTS)
+        self.assertEqual(
+            REGISTRY.get_sample_value(
+                "lectionary_esv_errors_total", {"kind": "timeout"}
+            ),
+            (timeouts or 0) + MAX_ATTEMPTS,
+        )
+
+        session.reset_mock()
+        session.get.side_effect = None
+        session.get.return_value = self.error_response(401)
+        with self.assertRaises(ESVError):
+            get_esv_passage("John 1:1")
+        self.assertEqual(session.get.call_count, 1)
+
+        session.reset_mock()
+        session.get.return_value = self.error_response(429, {"Retry-After": "5"})
+        with self.assertRaises(ESVRateLimitError):
+            get_esv_passage("John 1:1")
+        self.assertEqual(session.get.call_count, 1)
+
+    def test_retry_after(self, session, backoff):
+        """Retry-After is read as seconds or a date, and anything else falls
+        back to a default.
+        """
+
+        later = timezone.now() + dt.timedelta(seconds=30)
+        for value, expect in (
+            ("5", 5),
+            ("1.5", 2),
+            ("-3", 0),
+            (http_date(later.timestamp()), 30),
+            ("Wed, 21 Oct 2015 07:28:00 GMT", 0),
+            ("soon", RETRY_AFTER),
+            ("nan", RETRY_AFTER),
+            (None, RETRY_AFTER),
+        ):
+            headers = {} if value is None else {"Retry-After": value}
+            session.get.return_value = self.error_response(429, headers)
+            with self.assertRaises(ESVRateLimitError) as cm:
+                get_esv_passage("John 1:1")
+            self.assertAlmostEqual(cm.exception.retry_after, expect, delta=1)
+
+    def test_async_client_closed(self, session, backoff):
+        """The client of a loop which only lasts for a request is closed
+        along with the loop.
+        """
+
+        async def get_clients():
+            return get_async_client(), get_async_client()
+
+        first, second = async_to_sync(get_clients)()
+        self.assertIs(first, second)
+        self.assertTrue(first.is_closed)
+
+    def test_circuit_breaker(self, session, backoff):
+        """Once the API keeps failing, calls fail fast until it recovers."""
+
+        session.get.side_effect = requests.ConnectionError()
+        for reference in ["John 1:1", "John 1:2"]:
+            with self.assertRaises(ESVError):
+                get_esv_passage(reference)
+        calls = session.get.call_count
+
+        with self.assertRaises(ESVUnavailableError):
+            get_esv_passage("John 1:3")
+        self.assertEqual(session.get.call_count, calls)
+
+        # A single trial request is let through after a while
+        breaker.opened_at -= breaker.reset_timeout
+        session.get.side_effect = lambda url, params, **kwargs: FakeResponse(
+            url, params
+        )
+        get_esv_passage("John 1:3")
+        get_esv_passage("John 1:4")
+        self.assertEqual(session.get.call_count, calls + 2)
+
+    def test_client_errors(self, session, backoff):
+        """Requests the API refuses don't open the circuit."""
+
+        session.get.side_effect = None
+        session.get.return_value = self.error_response(400)
+        for _ in range(breaker.threshold + 1):
+            with self.assertRaises(ESVError) as cm:
+                get_esv_passage("Not a reference")
+            self.assertNotIsInstance(cm.exception, ESVUnavailableError)
+        self.assertEqual(session.get.call_count, breaker.threshold + 1)
+        self.assertIsNone(breaker.opened_at)
+
+    def test_coalescing(self, session, backoff):
+        """Concurrent requests for the same passage share a single fetch."""
+
+        release = threading.Event()
+
+        def get(url, params, **kwargs):
+            release.wait(5)
+            return FakeResponse(url, params)
+
+        session.get.side_effect = get
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(get_esv_passage("Mark 1")))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), 4)
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(session.get.call_count, 1)
+
+    async def test_async_coalescing(self, session, backoff):
+        esv = FakeESV()
+        with mock.patch("lectionary.services.scripture.get_async_client", esv.client):
+            results = await asyncio.gather(
+                *(aget_esv_passage("Mark 1") for _ in range(4))
+            )
+            self.assertEqual(len(esv.requests), 1)
+            self.assertEqual(len(set(results)), 1)
+
+            await aget_esv_passage("Mark 1")
+            self.assertEqual(len(esv.requests), 2)
+
+
+BIBLE_ROWS = [
+    ("Isaiah", 2, 1, "The word that Isaiah the son of Amoz saw."),
+    ("Isaiah", 2, 2, "It shall come to pass in the latter days."),
+    ("Romans", 13, 8, "Owe no one anything, except to love each other."),
+    ("Romans", 13, 14, "But put on the Lord Jesus Christ."),
+    ("Matthew", 24, 29, "Immediately after the tribulation of those days."),
+    ("Matthew", 24, 44, "Therefore you also must be ready."),
+    ("John", 3, 16, "For God so loved the world."),
+    ("John", 3, 17, "For God did not send his Son into the world to condemn it."),
+    ("John", 3, 18, "Whoever believes in him is not condemned & saved."),
+    ("John", 4, 1, "Now when Jesus learned that the Pharisees had heard."),
+    ("John", 4, 2, "Although Jesus himself did not baptize."),
+]
+
+
+class BibleIndexTestCase(TestCase):
+    def setUp(self):
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self.path = Path(tempdir.name) / "bible.idx"
+        write_bible_index(self.path, reversed(BIBLE_ROWS), name="Test")
+        self.index = BibleIndex(self.path)
+
+    def test_lookup(self):
+        self.assertEqual(len(self.index), len(BIBLE_ROWS))
+        self.assertEqual(self.index.name, "Test")
+        row = self.index.first_row("John", 3, 17)
+        self.assertEqual(self.index.verse_text(row), BIBLE_ROWS[7][3])
+        # Verses which are missing from the translation are skipped
+        self.assertEqual(
+            self.index.first_row("Romans", 13, 9), self.index.last_row("Romans", 13, 14)
+        )
+        with self.assertRaises(KeyError):
+            self.index.first_row("John", 5, 1)
+        with self.assertRaises(KeyError):
+            self.index.first_row("Jude", 1, 1)
+
+    def test_render(self):
+        html, text = self.index.render("John 3:17-4:1")
+        self.assertEqual(
+            text,
+            "17 For God did not send his Son into the world to condemn it. "
+            "18 Whoever believes in him is not condemned & saved. "
+            "4:1 Now when Jesus learned that the Pharisees had heard.",
+        )
+        self.assertIn("<b class='chapter-num'>4:1&nbsp;</b>", html)
+        self.assertIn("condemned &amp; saved", html)
+        self.assertEqual(html_to_text(html), text)
+
+        html, text = self.index.render("John 3:16, (18)")
+        self.assertEqual(
+            text,
+            "16 For God so loved the world.\n\n18 Whoever believes in him is not condemned & saved.",
+        )
+        self.assertEqual(html.count("<p>"), 2)
+
+        html, text = self.index.render("John 4")
+        self.assertTrue(text.startswith("4:1 Now"))
+        self.assertTrue(text.endswith("baptize."))
+
+    def test_provider(self):
+        provider = LocalProvider({"PATH": self.path})
+        html, text = provider.get_passage("John 3:16")
+        self.assertEqual(text, "John 3:16\n\n16 For God so loved the world.\n")
+        self.assertEqual(provider.get_passage("Jude 1:1"), ("", ""))
+        self.assertEqual(provider.get_passage("First Lesson"), ("", ""))
+        self.assertEqual(
+            LocalProvider({"PATH": self.path, "COPYRIGHT": "© Test"}).copyright,
+            "© Test",
+        )
+        self.assertEqual(
+            set(provider.get_passages({"John 3:16", "John 4:2"})),
+            {"John 3:16", "John 4:2"},
+        )
+
+    def test_build_command(self):
+        source = self.path.with_name("bible.tsv")
+        source.write_text(
+            "# book\tchapter\tverse\ttext\n"
+            + "".join(f"{b}\t{c}\t{v}\t{t}\n" for b, c, v, t in BIBLE_ROWS)
+        )
+        output = self.path.with_name("built.idx")
+        call_command("build_bible_index", source, output=output, stdout=StringIO())
+        index = BibleIndex(output)
+        self.assertEqual(
+            index.render("John 3:16-18"), self.index.render("John 3:16-18")
+        )
+
+        source.write_text("John\t3\tsixteen\tFor God so loved the world.\n")
+        with self.assertRaises(CommandError):
+            call_command("build_bible_index", source, output=output)
+
+    def test_local_detail(self):
+        """Lessons are read from the local provider without any requests."""
+
+        esv = FakeESV()
+        day = Day.objects.filter(name="First Sunday of Advent", year="A").first()
+        options = {"PATH": self.path}
+        with self.settings(
+            SCRIPTURE_PROVIDER={
+                "BACKEND": "lectionary.services.scripture.LocalProvider",
+                "OPTIONS": options,
+            }
+        ), mock.patch("lectionary.services.scripture.get_async_client", esv.client):
+            self.assertIsInstance(get_provider(), LocalProvider)
+            response = self.client.get(day.get_absolute_url())
+        self.assertContains(response, "Therefore you also must be ready.")
+        self.assertContains(response, "psalm-verse")
+        self.assertContains(response, "Scripture quotations are from the Test.")
+        self.assertNotContains(response, "Crossway")
+        self.assertEqual(esv.requests, [])
+        self.assertNotIsInstance(get_provider(), LocalProvider)
+
+    def test_switch_provider(self):
+        """Passages fetched from another provider are fetched again, rather
+        than served under the wrong attribution.
+        """
+
+        esv = FakeESV()
+        day = Day.objects.filter(name="First Sunday of Advent", year="A").first()
+        local = {
+            "BACKEND": "lectionary.services.scripture.LocalProvider",
+            "OPTIONS": {"PATH": self.path},
+        }
+        with mock.patch("lectionary.services.scripture.get_async_client", esv.client):
+            response = self.client.get(day.get_absolute_url())
+            self.assertContains(response, "Crossway")
+            self.assertEqual(len(esv.requests), 3)
+
+            with self.settings(SCRIPTURE_PROVIDER=local):
+                self.assertEqual(day.lessons.from_other_sources().count(), 3)
+                response = self.client.get(day.get_absolute_url())
+                self.assertContains(response, "Therefore you also must be ready.")
+                self.assertNotContains(response, "Crossway")
+                self.assertFalse(day.lessons.from_other_sources().exists())
+
+                # Invalidated passages keep their source, and are still served
+                day.lessons.invalidate()
+                response = self.client.get(day.get_absolute_url())
+                self.assertContains(response, "Therefore you also must be ready.")
+
+            self.assertEqual(day.lessons.from_other_sources().count(), 3)
+            response = self.client.get(day.get_absolute_url())
+            self.assertContains(response, "Crossway")
+            self.assertEqual(len(esv.requests), 6)
+
+
+class ScriptureServicesTestCase(TestCase):
+    def test_html_to_text(self):
+        """Plain text is derived from the html of a passage."""
+
+        html = (
+            "<p class='block-indent'><span class='line'>"
+            "<b class='chapter-num'>23:1&nbsp;</b>&nbsp;&nbsp;The "
+            "<span class='divine-name'>Lord</span> is my shepherd;</span><br />"
+            "<span class='indent line'>I shall not want.</span><br /></p>"
+            "<h3>A Heading</h3>"
+            "<p><b class='verse-num'>2&nbsp;</b>He makes me lie down"
+            "<sup class='footnote'><a href='#f1'>1</a></sup> in green pastures.</p>"
+        )
+        expect = (
+            "23:1 The LORD is my shepherd;\n"
+            "I shall not want.\n\n"
+            "2 He makes me lie down in green pastures."
+        )
+        self.assertEqual(html_to_text(html), expect)
+
+
+@mock.patch("lectionary.services.scripture.session")
+class WarmLessonsTestCase(TestCase):
+    def test_warm_lessons(self, session):
+        """Every uncached lesson for the given years is cached."""
+
+        session.get.side_effect = lambda url, params, **kwargs: FakeResponse(
+            url, params
+        )
+        call_command(
+            "warm_lessons",
+            "--years=A",
+            "--rate=0",
+            "--batch-size=50",
+            stdout=StringIO(),
+            stderr=StringIO(),
+        )
+
+        year_a = Lesson.objects.filter(day__year="A").distinct()
+        cached = year_a.exclude(html__isnull=True).exclude(html="")
+        self.assertGreater(cached.count(), 0)
+        self.assertFalse(
+            Lesson.objects.filter(day__year="B", html__isnull=False)
+            .exclude(day__year="A")
+            .exists()
+        )
+
+        # Only lessons which failed to render are left for the next run
+        calls = session.get.call_count
+        call_command(
+            "warm_lessons",
+            "--years=A",
+            "--rate=0",
+            stdout=StringIO(),
+            stderr=StringIO(),
+        )
+        self.assertEqual(session.get.call_count, calls)
+
+    def test_refresh(self, session):
+        """Stale lessons are only fetched again with --refresh, and keep
+        their old content if they can't be.
+        """
+
+        self.addCleanup(breaker.reset)
+        day = Day.objects.filter(name="First Sunday of Advent", year="A").first()
+        lessons = day.lessons.exclude(reference__startswith="Psalm")
+        for lesson in Lesson.objects.filter(day__year="A").distinct():
+            lesson.set_content("<p>old</p>", "old")
+            lesson.save()
+        lessons.invalidate()
+
+        session.get.return_value = mock.Mock(status_code=400, headers={})
+        args = ["warm_lessons", "--years=A", "--rate=0"]
+        call_command(*args, stdout=StringIO(), stderr=StringIO())
+        session.get.assert_not_called()
+        call_command(*args, "--refresh", stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(session.get.call_count, 3)
+        for lesson in lessons:
+            self.assertEqual(lesson.html, "<p>old</p>")
+            self.assertTrue(lesson.is_stale())
+
+        session.get.reset_mock()
+        session.get.return_value = None
+        session.get.side_effect = lambda url, params, **kwargs: FakeResponse(
+            url, params
+        )
+        call_command(*args, "--refresh", stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(session.get.call_count, 3)
+        for lesson in lessons.all():
+            self.assertIn(lesson.reference, lesson.html)
+            self.assertFalse(lesson.is_stale())
+
+        call_command(*args, "--max-age=0", stdout=StringIO(), stderr=StringIO())
+        self.assertGreater(session.get.call_count, 3)
+
+    def test_invalid_years(self, session):
+        """Unknown lectionary years are rejected."""
+
+        with self.assertRaises(CommandError):
+            call_command("warm_lessons", "--years=D")
+
+
+class BenchmarkTestCase(TestCase):
+    def test_benchmark(self):
+        """The suite runs without changing anything, and a baseline catches
+        cases which make more queries.
+        """
+
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        baseline = Path(tempdir.name) / "baseline.json"
+        args = ["benchmark", "index_4w_cold", "detail_cold", "psalm_119"]
+        options = {"repeat": 1, "esv_latency": 0, "stdout": StringIO()}
+
+        call_command(*args, save=baseline, **options)
+        results = json.loads(baseline.read_text())["cases"]
+        self.assertEqual(set(results), {"index_4w_cold", "detail_cold", "psalm_119"})
+        self.assertEqual(results["index_4w_cold"]["queries"], 1)
+        self.assertFalse(Lesson.objects.filter(html__isnull=False).exists())
+
+        results["detail_cold"]["queries"] -= 1
+        baseline.write_text(json.dumps({"cases": results}))
+        with self.assertRaisesMessage(CommandError, "1 regressions"):
+            call_command(
+                *args, compare=baseline, tolerance=100, stderr=StringIO(), **options
+            )
+
+        with self.assertRaises(CommandError):
+            call_command("benchmark", "missing", **options)
+
+
+class LoadLectionaryDataTestCase(TestCase):
+    def test_refuses_existing_data(self):
+        """Data is not loaded twice without --flush."""
+
+        with self.assertRaises(CommandError):
+            call_command("load_lectionary_data", stdout=StringIO())
+
+    def test_flush(self):
+        """Reloading the data gives the same days, lessons, and collects."""
+
+        def snapshot():
+            return {
+                (day.name, day.year, day.service, day.season, day.color): (
+                    [lesson.reference for lesson in day.lessons.order_by("daylesson")],
+                    [collect.text for collect in day.collects.order_by("daycollect")],
+                )
+                for day in Day.objects.all()
+            }
+
+        before = snapshot()
+        verses = Verse.objects.count()
+        call_command("load_lectionary_data", "--flush", stdout=StringIO())
+
+        self.assertEqual(snapshot(), before)
+        self.assertEqual(Verse.objects.count(), verses)
+        self.assertEqual(CalendarEntry.objects.count(), Day.objects.count())
+        self.assertEqual(
+            Lesson.objects.count(),
+            Lesson.objects.values("reference").distinct().count(),
+        )
+
+
+class QueryPlanTestCase(TestCase):
+    def assertUsesIndex(self, queryset, name):
+        """Assert that the query plan for a queryset uses the named index
+        or unique constraint.
+        """
+
+        table = queryset.model._meta.db_table
+        names = {name}
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                # The tables are too small for an index to beat a scan
+                cursor.execute("SET LOCAL enable_seqscan = off")
+            elif connection.vendor == "sqlite":
+                # Unique constraints are backed by automatically named indexes
+                constraints = connection.introspection.get_constraints(cursor, table)
+                columns = constraints[name]["columns"]
+                cursor.execute(f"PRAGMA index_list({table})")
+                for index in [row[1] for row in cursor.fetchall()]:
+                    cursor.execute(f"PRAGMA index_info({index})")
+                    if [row[2] for row in cursor.fetchall()] == columns:
+                        names.add(index)
+
+        plan = queryset.explain()
+        self.assertTrue(any(n in plan for n in names), plan)
+
+    def test_day_by_name_and_year(self):
+        days = Day.objects.filter(
+            name__in=["Easter Day", "Proper 10"], year__in=["A", "B"]
+        )
+        self.assertUsesIndex(days, "day_name_year_idx")
+
+    def test_calendar_entry_by_name_and_year(self):
+        entries = CalendarEntry.objects.filter(
+            name__in=["Easter Day", "Proper 10"], year__in=["A", "B"]
+        )
+        self.assertUsesIndex(entries, "calendar_entry_name_year_idx")
+
+    def test_lessons_by_day(self):
+        day_lessons = DayLesson.objects.filter(day_id__in=[1, 2, 3])
+        self.assertUsesIndex(day_lessons, "unique_day_lesson")
+
+    def test_collects_by_day(self):
+        day_collects = DayCollect.objects.filter(day_id__in=[1, 2, 3])
+        self.assertUsesIndex(day_collects, "unique_day_collect")
+
+    def test_psalm_by_number(self):
+        self.assertUsesIndex(Psalm.objects.filter(number=23), "unique_psalm_number")
+
+    def test_verse_by_psalm_and_number(self):
+        verses = Verse.objects.filter(psalm_id=23, number=1)
+        self.assertUsesIndex(verses, "unique_psalm_verse")
+        verses = Verse.objects.filter(psalm_id=23).order_by("number")
+        self.assertUsesIndex(verses, "unique_psalm_verse")
+
+
+class ReferenceTestCase(TestCase):
+    def test_parse_reference(self):
+        """References are parsed into a book, chapter, and verse ranges."""
+
+        reference = parse_reference("1 Corinthians 4:(1-7), 8-21")
+        self.assertEqual(reference.book, "1 Corinthians")
+        self.assertEqual(reference.chapter, 4)
+        self.assertEqual(reference.ranges, (VerseRange(4, 1, 4, 21),))
+
+        reference = parse_reference("Acts 6:1-9; 7:2a, 51-60")
+        self.assertEqual(
+            reference.ranges,
+            (VerseRange(6, 1, 6, 9), VerseRange(7, 2, 7, 2), VerseRange(7, 51, 7, 60)),
+        )
+
+        reference = parse_reference("1 John 1:1-2:2")
+        self.assertEqual(reference.ranges, (VerseRange(1, 1, 2, 2),))
+        with self.assertRaises(ValueError):
+            reference.verse_ranges()
+
+    def test_irregular_references(self):
+        """Whole chapters, single-chapter books, and unspaced parentheses
+        are understood.
+        """
+
+        reference = parse_reference("Psalm 23")
+        self.assertEqual((reference.chapter, reference.ranges), (23, ()))
+        self.assertTrue(reference.is_psalm)
+
+        reference = parse_reference("Philemon(1-3), 4-21, (22-25)")
+        self.assertEqual(reference.ranges, (VerseRange(1, 1, 1, 25),))
+
+        reference = parse_reference("Psalm 33(1-9), 10-21")
+        self.assertEqual(reference.verse_ranges(), [(1, 21)])
+
+        reference = parse_reference("John(18:1-40); 19:1-37")
+        self.assertEqual(reference.chapter, 18)
+        self.assertEqual(reference.book, "John")
+
+    def test_parse_lesson(self):
+        """Alternate readings are parsed separately."""
+
+        first, second = parse_lesson("Psalm 130 or Psalm 31:1-6")
+        self.assertEqual(first.chapter, 130)
+        self.assertEqual(second.verse_ranges(), [(1, 6)])
+
+        # An alternate without a book is in the book of the one before it
+        first, second = parse_lesson("Isaiah 40:1-11 or 40:1-5")
+        self.assertEqual(second.book, "Isaiah")
+        self.assertEqual(second.verse_ranges(), [(1, 5)])
+        first, second = parse_lesson("Psalm 119:1-8 or 119:9-16")
+        self.assertTrue(second.is_psalm)
+        self.assertEqual(second.verse_ranges(), [(9, 16)])
+
+    def test_is_psalm(self):
+        """Lessons are told apart from psalms even when they can't be
+        parsed.
+        """
+
+        for reference, is_psalm in (
+            ("Isaiah 40:1-11 or 40:1-5", False),
+            ("Psalm 119:1-8 or 119:9-16", True),
+            ("Psalm 23:1-3 (4-6)", True),
+            ("Psalm 23:1-3 [4-6]", True),
+            ("Isaiah 40 verse 1", False),
+        ):
+            self.assertEqual(Lesson(reference=reference).is_psalm, is_psalm)
+
+        esv = FakeESV()
+        day = Day.objects.filter(name="First Sunday of Advent", year="A").first()
+        for reference in ("Isaiah 40:1-11 or 40:1-5", "Psalm 23:1-3 [4-6]"):
+            lesson = Lesson.objects.create(reference=reference)
+            DayLesson.objects.create(day=day, lesson=lesson)
+        with mock.patch("lectionary.services.scripture.get_async_client", esv.client):
+            with self.assertLogs("django", "WARNING"):
+                response = self.client.get(day.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Isaiah 40:1-11 or 40:1-5")
+
+    def test_every_lesson(self):
+        """Every lesson in the lectionary can be parsed."""
+
+        for lesson in Lesson.objects.all():
+            self.assertTrue(parse_lesson(lesson.reference))
+
+    def test_long_reference(self):
+        """Optional verses are included in the long form of a reference."""
+
+        self.assertEqual(
+            long_reference("Zechariah 14:(1-2), 3-9"), "Zechariah 14:1-2, 3-9"
+        )
+        self.assertEqual(long_reference("Acts 2:1-11(12-21)"), "Acts 2:1-11, 12-21")
+        self.assertEqual(long_reference("Psalm 33(1-9), 10-21"), "Psalm 33:1-9, 10-21")
+        self.assertEqual(long_reference("Psalm 23:1-3 (4-6)"), "Psalm 23:1-3, 4-6")
+        self.assertEqual(
+            short_reference("1 Corinthians 4:(1-7), 8-21"), "1 Corinthians 4:8-21"
+        )
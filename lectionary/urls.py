@@ -6,4 +6,7 @@ urlpatterns = [
     path("", views.index, name="index"),
     path("about/", views.about, name="about"),
     path("<int:pk>/", views.detail, name="detail"),
+    path("api/v1/calendar/", views.api_calendar, name="api_calendar"),
+    path("api/v1/lessons/<int:pk>/", views.api_lesson, name="api_lesson"),
+    path("calendar.ics", views.ics_calendar, name="ics_calendar"),
 ]
@@ -2,10 +2,39 @@ import datetime as dt
 import json
 import logging
 
-from django.shortcuts import get_object_or_404, render
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, get_object_or_404, render
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
 
-from lectionary.models import Day, DayLesson
-from lectionary.services.lectionary import Lectionary
+from lectionary.models import Day, DayLesson, FetchJob, Lesson, get_fetch_options
+from lectionary.services.calendar import build_calendar, iter_calendar
+from lectionary.services.etags import (
+    get_api_calendar_etag,
+    get_detail_etag,
+    get_ics_etag,
+    get_index_etag,
+)
+from lectionary.services.ics import iter_ics
+from lectionary.services.scripture import get_placeholder, get_provider
+from website import timing
+
+# Pages for a given range or day only change along with the data, and are
+# revalidated with their ETag after this long.
+IMMUTABLE_MAX_AGE = 60 * 60 * 24
+# The default range starts today, so it is only cached briefly.
+TODAY_MAX_AGE = 60 * 5
+# About a century, which is more than any client should need in one go
+API_MAX_DAYS = 36525
+# The whole three-year cycle, since the page is rendered all at once
+INDEX_MAX_DAYS = 3 * 366
+ICS_MAX_YEARS = 50
+# Every event ends the day after it starts, which is past date.max for the
+# last day of 9999
+ICS_YEARS = range(dt.MINYEAR, dt.MAXYEAR)
+# Calendar clients are asked to refresh the feed twice a day
+ICS_MAX_AGE = 60 * 60 * 12
 
 
 def index(request):
@@ -25,57 +54,187 @@ def index(request):
     except (TypeError, ValueError) as e:
         logger.error(e)
 
+    max_age = IMMUTABLE_MAX_AGE
     if not start_date:
         start_date = dt.date.today()
+        max_age = TODAY_MAX_AGE
     if not end_date:
-        end_date = start_date + dt.timedelta(weeks=4)
-
-    dates = []
-    current_date = start_date
-    while current_date <= end_date:
-        dates.append(current_date)
-        current_date += dt.timedelta(days=1)
-
-    calendar = {}
-    for date in dates:
-        lectionary = Lectionary(date)
-        hr_date = date.strftime("%A, %D")
-        calendar[hr_date] = []
-        for name in lectionary.names:
-            for day in Day.objects.filter(name=name, year=lectionary.year):
-                lessons = [d.lesson for d in DayLesson.objects.filter(day=day)]
-                calendar[hr_date].append(
-                    {
-                        "day": day,
-                        "year": lectionary.year,
-                        "season": lectionary.season,
-                        "lessons": lessons,
-                    }
-                )
-
-    # Remove all dates from calendar which have no lectionary data
-    calendar = {k: v for k, v in calendar.items() if len(v) != 0}
-
-    return render(request, "lectionary/index.html", {"calendar": calendar})
-
-
-def detail(request, pk):
-    day = get_object_or_404(Day, pk=pk)
+        # Stop short at the end of the calendar (date.max)
+        end_date = start_date + min(dt.timedelta(weeks=4), dt.date.max - start_date)
+    if (end_date - start_date).days >= INDEX_MAX_DAYS:
+        return HttpResponseBadRequest(
+            f"Ranges may be at most {INDEX_MAX_DAYS} days long."
+        )
 
-    lessons = []
-    for lesson in [d.lesson for d in DayLesson.objects.filter(day=day)]:
-        html = lesson.get_html()
-        text = lesson.get_text()
+    etag = get_index_etag(start_date, end_date)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        calendar = build_calendar(start_date, end_date)
+        with timing.timed("render"):
+            response = render(request, "lectionary/index.html", {"calendar": calendar})
+
+    response.headers["ETag"] = etag
+    patch_cache_control(response, public=True, max_age=max_age)
+    return response
+
+
+def api_calendar(request):
+    """Return the calendar for a range of dates as JSON. The response is
+    streamed a chunk of dates at a time, so long ranges are never held in
+    memory all at once.
+    """
+
+    date_format = "%Y-%m-%d"
+    max_age = IMMUTABLE_MAX_AGE
+
+    try:
+        start = request.GET.get("start")
+        if start:
+            start_date = dt.datetime.strptime(start, date_format).date()
+        else:
+            start_date = dt.date.today()
+            max_age = TODAY_MAX_AGE
+        end = request.GET.get("end")
+        if end:
+            end_date = dt.datetime.strptime(end, date_format).date()
+        else:
+            end_date = start_date + min(dt.timedelta(weeks=4), dt.date.max - start_date)
+    except ValueError:
+        return JsonResponse({"error": "Dates must be given as YYYY-MM-DD."}, status=400)
+
+    if end_date < start_date:
+        return JsonResponse({"error": "The end date is before the start."}, status=400)
+    if (end_date - start_date).days >= API_MAX_DAYS:
+        return JsonResponse(
+            {"error": f"Ranges may be at most {API_MAX_DAYS} days long."}, status=400
+        )
+
+    etag = get_api_calendar_etag(start_date, end_date)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = StreamingHttpResponse(
+            aiter_chunks(stream_calendar(start_date, end_date)),
+            content_type="application/json",
+        )
+
+    response.headers["ETag"] = etag
+    patch_cache_control(response, public=True, max_age=max_age)
+    return response
+
+
+async def aiter_chunks(chunks):
+    """Serve a synchronous iterator (which may query the database) to an
+    ASGI server a chunk at a time. Given the iterator itself, Django would
+    read it all into memory before sending any of it.
+    """
+
+    chunks = iter(chunks)
+    get_next = sync_to_async(next)
+    while (chunk := await get_next(chunks, None)) is not None:
+        yield chunk
+
+
+def stream_calendar(start_date, end_date):
+    yield f'{{"start": "{start_date}", "end": "{end_date}", "days": ['
+
+    separator = ""
+    for date, entries in iter_calendar(start_date, end_date):
+        day = {
+            "date": date.isoformat(),
+            "entries": [
+                {
+                    "name": entry["day"]["name"],
+                    "service": entry["day"]["service"],
+                    "color": entry["day"]["color"],
+                    "season": entry["season"],
+                    "year": entry["year"],
+                    "lessons": entry["lessons"],
+                    "url": entry["day"]["url"],
+                }
+                for entry in entries
+            ],
+        }
+        yield separator + json.dumps(day)
+        separator = ", "
 
+    yield "]}"
+
+
+def ics_calendar(request):
+    """Return the lectionary as an iCalendar feed, covering last year to
+    two years from now unless a range of years is given.
+    """
+
+    this_year = dt.date.today().year
+    try:
+        start_year = int(request.GET.get("start", this_year - 1))
+        end_year = int(request.GET.get("end", this_year + 2))
+    except ValueError:
+        return HttpResponseBadRequest("Years must be given as numbers.")
+    if not (start_year in ICS_YEARS and end_year in ICS_YEARS):
+        return HttpResponseBadRequest(
+            f"Years must be from {ICS_YEARS.start} to {ICS_YEARS.stop - 1}."
+        )
+    if end_year < start_year:
+        return HttpResponseBadRequest("The range of years is invalid.")
+    if end_year - start_year >= ICS_MAX_YEARS:
+        return HttpResponseBadRequest(f"Feeds may cover at most {ICS_MAX_YEARS} years.")
+
+    base_url = request.build_absolute_uri("/")
+    etag = get_ics_etag(start_year, end_year, base_url)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = StreamingHttpResponse(
+            aiter_chunks(iter_ics(start_year, end_year, base_url)),
+            content_type="text/calendar; charset=utf-8",
+        )
+        response.headers["Content-Disposition"] = 'inline; filename="lectionary.ics"'
+
+    response.headers["ETag"] = etag
+    patch_cache_control(response, public=True, max_age=ICS_MAX_AGE)
+    return response
+
+
+async def detail(request, pk):
+    day = await aget_object_or_404(Day, pk=pk)
+
+    day_lessons = [
+        d.lesson
+        async for d in DayLesson.objects.filter(day=day)
+        .select_related("lesson")
+        .order_by("pk")
+    ]
+
+    # Only pages whose lessons are all cached can be revalidated, and these
+    # are answered before anything is fetched or rendered.
+    etag = await sync_to_async(get_detail_etag)(day, day_lessons)
+    if etag is not None:
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            return cache_detail(response, etag)
+
+    await Lesson.acache_all(day_lessons)
+
+    options = get_fetch_options()
+    queued = options["MODE"] == "queue"
+    lessons = []
+    for lesson in day_lessons:
+        html, text = lesson.html, lesson.text
+        poll_url = None
+        if not lesson.is_cached:
+            # The passage is either queued for the worker, and filled in by
+            # the page once it is ready, or could not be fetched because the
+            # ESV API is down. Either way the page is served without an
+            # ETag, so that it is fetched again next time.
+            pending = queued and not lesson.is_psalm
+            html, text = get_placeholder(lesson.reference, pending=pending)
+            if pending:
+                poll_url = reverse("api_lesson", kwargs={"pk": lesson.pk})
         lessons.append(
-            {
-                "ref": lesson.reference,
-                "html": html,
-                "text": text,
-            }
+            {"ref": lesson.reference, "html": html, "text": text, "poll_url": poll_url}
         )
 
-    collects = [collect.text for collect in day.collects.all()]
+    collects = [collect.text async for collect in day.collects.order_by("daycollect")]
 
     texts = json.dumps("\n".join([lesson["text"] for lesson in lessons]))
 
@@ -84,9 +243,50 @@ def detail(request, pk):
         "collects": collects,
         "lessons": lessons,
         "texts": texts,
+        "copyright": get_provider().copyright,
     }
+    if any(lesson["poll_url"] for lesson in lessons):
+        context["lesson_texts"] = json.dumps([lesson["text"] for lesson in lessons])
+        context["poll_interval"] = options["POLL_INTERVAL"]
+
+    with timing.timed("render"):
+        response = render(request, "lectionary/detail.html", context=context)
+    etag = await sync_to_async(get_detail_etag)(day, day_lessons)
+    return cache_detail(response, etag)
+
+
+def cache_detail(response, etag):
+    if etag is None:
+        # Some lessons could not be fetched, so try again next time
+        patch_cache_control(response, no_cache=True)
+    else:
+        response.headers["ETag"] = etag
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE)
+    return response
+
+
+def api_lesson(request, pk):
+    """Return the html and text of a lesson as JSON, for pages to poll for
+    lessons queued to be fetched. The status is "pending" while the lesson
+    is queued, and "failed" if it was given up (with a placeholder).
+    """
+
+    lesson = get_object_or_404(Lesson, pk=pk)
+    if lesson.is_cached:
+        status = "ready"
+        html, text = lesson.html, lesson.text
+    elif FetchJob.objects.filter(lesson=lesson).exists():
+        status = "pending"
+        html, text = get_placeholder(lesson.reference, pending=True)
+    else:
+        status = "failed"
+        html, text = get_placeholder(lesson.reference)
 
-    return render(request, "lectionary/detail.html", context=context)
+    response = JsonResponse(
+        {"reference": lesson.reference, "status": status, "html": html, "text": text}
+    )
+    patch_cache_control(response, no_cache=True)
+    return response
 
 
 def about(request):
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class PsalterConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "psalter"
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from psalter.repository import clear_psalter
+
+        for signal in (post_save, post_delete):
+            signal.connect(clear_psalter, sender="psalter.Verse")
+            signal.connect(clear_psalter, sender="psalter.Psalm")
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.7 on 2026-10-18 13:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('psalter', '0002_psalm_verse_data'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='verse',
+            name='psalm',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='psalter.psalm'),
+        ),
+        migrations.AddConstraint(
+            model_name='psalm',
+            constraint=models.UniqueConstraint(fields=('number',), name='unique_psalm_number'),
+        ),
+        migrations.AddConstraint(
+            model_name='verse',
+            constraint=models.UniqueConstraint(fields=('psalm', 'number'), name='unique_psalm_verse'),
+        ),
+    ]
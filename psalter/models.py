@@ -1,56 +1,52 @@
 from django.db import models
 
-from psalter.services import parse_verse_nums
-from lectionary.services.scripture import long_reference
+from psalter.repository import get_psalter
+from lectionary.services.reference import long_reference, parse_lesson
 
 
 class Psalm(models.Model):
     number = models.IntegerField()
     title = models.CharField(max_length=256)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["number"], name="unique_psalm_number")
+        ]
+
     def __str__(self):
         return f"Psalm {self.number}"
 
+    def get_verse_ranges(self, reference):
+        if reference.ranges:
+            return reference.verse_ranges()
+        return get_psalter().verse_ranges(self.number)
+
     def get_html(self, reference):
-        reference = long_reference(reference)
-
-        if ":" in reference:
-            verse_nums = parse_verse_nums(reference)
-        else:
-            verse_nums = [verse.number for verse in self.verse_set.all()]
-
-        verses = []
-        for num in verse_nums:
-            verse = self.verse_set.get(number=num)
-            verses.append(
-                f"<p class='psalm-verse'><b>{verse.number} </b>"
-                f"<span class='first-half'>&nbsp;{verse.first_half} *</span><br />"
-                f"<span class='second-half'>&nbsp;&nbsp;{verse.second_half}</span></p>"
-            )
-        return "".join(verses)
+        # Only the first of any alternate readings is rendered
+        reference = parse_lesson(reference)[0]
+        ranges = self.get_verse_ranges(reference)
+        return get_psalter().render_html(self.number, ranges)
 
     def get_text(self, reference):
-        reference = long_reference(reference)
-
-        if ":" in reference:
-            verse_nums = parse_verse_nums(reference)
-        else:
-            verse_nums = [verse.number for verse in self.verse_set.all()]
-
-        verses = []
-        verses.append(f"{reference}\n")
-        for num in verse_nums:
-            verse = self.verse_set.get(number=num)
-            verses.append(f"{verse.number} {verse.first_half} *\n{verse.second_half}\n")
-        verses.append
-        return "\n".join(verses) + "\n"
+        reference = parse_lesson(reference)[0]
+        ranges = self.get_verse_ranges(reference)
+        header = long_reference(reference.raw)
+        return f"{header}\n" + get_psalter().render_text(self.number, ranges) + "\n"
 
 
 class Verse(models.Model):
     number = models.IntegerField()
     first_half = models.TextField()
     second_half = models.TextField()
-    psalm = models.ForeignKey(Psalm, on_delete=models.CASCADE)
+    # Lookups by psalm use the leading column of the unique index below
+    psalm = models.ForeignKey(Psalm, on_delete=models.CASCADE, db_index=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["psalm", "number"], name="unique_psalm_verse"
+            )
+        ]
 
     def __str__(self):
         return f"Psalm {self.psalm.number}:{self.number}"
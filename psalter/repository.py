@@ -0,0 +1,121 @@
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+
+# Stored with every psalm rendered into a lesson. Bump it whenever the way
+# verses are rendered changes, so that lessons rendered before are refreshed.
+CONTENT_VERSION = "psalter:1"
+
+
+def render_verse_html(number: int, first_half: str, second_half: str) -> str:
+    return (
+        f"<p class='psalm-verse'><b>{number} </b>"
+        f"<span class='first-half'>&nbsp;{first_half} *</span><br />"
+        f"<span class='second-half'>&nbsp;&nbsp;{second_half}</span></p>"
+    )
+
+
+def render_verse_text(number: int, first_half: str, second_half: str) -> str:
+    # The leading newline separates each verse from the one before it
+    return f"\n{number} {first_half} *\n{second_half}\n"
+
+
+class PsalterIndex:
+    """The whole psalter held in memory. Verses are stored in flat lists
+    ordered by (psalm, verse), with an array of offsets marking where each
+    psalm begins, so that a verse is found by bisecting within its psalm.
+
+    Every verse is also rendered once, up front, into one contiguous html
+    buffer and one text buffer. Since verses are stored in order, a range
+    of verses is a single slice of each buffer.
+    """
+
+    def __init__(self, rows):
+        self.numbers = array("H")
+        self.first_halves = []
+        self.second_halves = []
+        self.offsets = array("I", [0])
+
+        html = []
+        text = []
+        self.html_offsets = array("I", [0])
+        self.text_offsets = array("I", [0])
+
+        psalm = 0
+        for psalm_num, number, first_half, second_half in rows:
+            while psalm < psalm_num:
+                self.offsets.append(len(self.numbers))
+                psalm += 1
+            self.numbers.append(number)
+            self.first_halves.append(first_half)
+            self.second_halves.append(second_half)
+
+            html.append(render_verse_html(number, first_half, second_half))
+            text.append(render_verse_text(number, first_half, second_half))
+            self.html_offsets.append(self.html_offsets[-1] + len(html[-1]))
+            self.text_offsets.append(self.text_offsets[-1] + len(text[-1]))
+        self.offsets.append(len(self.numbers))
+
+        self.html = "".join(html)
+        self.text = "".join(text)
+
+    def __contains__(self, psalm: int) -> bool:
+        return 0 < psalm < len(self.offsets) - 1
+
+    def _bounds(self, psalm: int) -> tuple[int, int]:
+        if psalm not in self:
+            raise KeyError(psalm)
+        return self.offsets[psalm], self.offsets[psalm + 1]
+
+    def position(self, psalm: int, verse: int) -> int:
+        """Return the index of a verse within the flat verse lists."""
+
+        lo, hi = self._bounds(psalm)
+        i = bisect_left(self.numbers, verse, lo, hi)
+        if i == hi or self.numbers[i] != verse:
+            raise KeyError((psalm, verse))
+        return i
+
+    def verse_nums(self, psalm: int) -> list[int]:
+        lo, hi = self._bounds(psalm)
+        return self.numbers[lo:hi].tolist()
+
+    def get(self, psalm: int, verse: int) -> tuple[str, str]:
+        i = self.position(psalm, verse)
+        return self.first_halves[i], self.second_halves[i]
+
+    def verse_ranges(self, psalm: int) -> list[tuple[int, int]]:
+        """Return the range covering every verse of a psalm."""
+
+        lo, hi = self._bounds(psalm)
+        return [(self.numbers[lo], self.numbers[hi - 1])]
+
+    def _slices(self, buffer, offsets, psalm, ranges):
+        for start, end in ranges:
+            i = self.position(psalm, start)
+            j = self.position(psalm, end)
+            yield buffer[offsets[i] : offsets[j + 1]]
+
+    def render_html(self, psalm: int, ranges: list[tuple[int, int]]) -> str:
+        return "".join(self._slices(self.html, self.html_offsets, psalm, ranges))
+
+    def render_text(self, psalm: int, ranges: list[tuple[int, int]]) -> str:
+        return "".join(self._slices(self.text, self.text_offsets, psalm, ranges))
+
+
+@lru_cache(maxsize=None)
+def get_psalter() -> PsalterIndex:
+    """Load the psalter from the database (in a single query) the first
+    time it is needed by this process.
+    """
+
+    from psalter.models import Verse
+
+    rows = Verse.objects.order_by("psalm__number", "number").values_list(
+        "psalm__number", "number", "first_half", "second_half"
+    )
+    return PsalterIndex(rows.iterator())
+
+
+def clear_psalter(**kwargs):
+    get_psalter.cache_clear()
@@ -1,24 +1,13 @@
-import re
+from lectionary.services.reference import parse_lesson
 
 
 def parse_psalm_num(reference):
-    return int(re.match(r"Psalm (\d+):?.*", reference)[1])
+    return parse_lesson(reference)[0].chapter
 
 
-def parse_verse_nums(reference):
-    ref_regex = re.compile(r":|;|,|\s|\(|\)")
-
-    verse_nums = []
-    for ref in re.split(ref_regex, reference.split(":")[1]):
-        if ref == "":
-            continue
+def parse_verse_ranges(reference):
+    return parse_lesson(reference)[0].verse_ranges()
 
-        if "-" in ref:
-            start = int(ref.split("-")[0])
-            end = int(ref.split("-")[1])
-            for v in range(start, end + 1):
-                verse_nums.append(v)
-        else:
-            verse_nums.append(int(ref))
 
-    return verse_nums
+def parse_verse_nums(reference):
+    return parse_lesson(reference)[0].verse_nums()
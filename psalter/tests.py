@@ -1,5 +1,7 @@
 from django.test import TestCase
-from psalter.services import parse_psalm_num, parse_verse_nums
+from psalter.models import Psalm, Verse
+from psalter.repository import get_psalter, render_verse_html
+from psalter.services import parse_psalm_num, parse_verse_nums, parse_verse_ranges
 
 
 class PsalterServicesTestCase(TestCase):
@@ -17,3 +19,64 @@ class PsalterServicesTestCase(TestCase):
         self.assertEqual(parse_verse_nums("Psalm 23:1, 6"), [1, 6])
         self.assertEqual(parse_verse_nums("Psalm 23:1-6"), [1, 2, 3, 4, 5, 6])
         self.assertEqual(parse_verse_nums("Psalm 23:1, (2-3), 4-6"), [1, 2, 3, 4, 5, 6])
+
+    def test_parse_verse_ranges(self):
+        """Verse ranges are parsed from reference without being expanded."""
+
+        self.assertEqual(parse_verse_ranges("Psalm 23:1"), [(1, 1)])
+        self.assertEqual(parse_verse_ranges("Psalm 119:1-176"), [(1, 176)])
+        self.assertEqual(parse_verse_ranges("Psalm 72:1-15, (16-19)"), [(1, 19)])
+        self.assertEqual(parse_verse_ranges("Psalm 80:1-7, 16-19"), [(1, 7), (16, 19)])
+
+
+class PsalterIndexTestCase(TestCase):
+    def test_verse_nums(self):
+        """Verse numbers are read from the index, including gaps."""
+
+        psalter = get_psalter()
+        self.assertEqual(psalter.verse_nums(23), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(psalter.verse_nums(10)[-2:], [20, 29])
+        self.assertEqual(len(psalter.verse_nums(119)), 176)
+        with self.assertRaises(KeyError):
+            psalter.get(10, 21)
+        with self.assertRaises(KeyError):
+            psalter.verse_nums(151)
+
+    def test_render_without_queries(self):
+        """Psalms are rendered without querying the database."""
+
+        psalm = Psalm.objects.get(number=23)
+        get_psalter()
+        with self.assertNumQueries(0):
+            html = psalm.get_html("Psalm 23:1-2")
+            text = psalm.get_text("Psalm 23:1-2")
+
+        verse = psalm.verse_set.get(number=2)
+        self.assertEqual(html.count("psalm-verse"), 2)
+        self.assertIn(
+            f"<b>2 </b><span class='first-half'>&nbsp;{verse.first_half}", html
+        )
+        self.assertTrue(text.startswith("Psalm 23:1-2\n\n1 "))
+        self.assertTrue(text.endswith(f"{verse.second_half}\n\n"))
+
+    def test_render_slices(self):
+        """Rendering ranges of verses matches rendering verse by verse."""
+
+        psalter = get_psalter()
+        expect = "".join(
+            render_verse_html(num, *psalter.get(119, num))
+            for num in [*range(1, 9), *range(33, 41)]
+        )
+        self.assertEqual(psalter.render_html(119, [(1, 8), (33, 40)]), expect)
+        self.assertEqual(psalter.verse_ranges(10), [(1, 29)])
+
+    def test_cleared_on_save(self):
+        """The index is reloaded after a verse changes."""
+
+        # The change is rolled back after the test, but the index is not.
+        self.addCleanup(get_psalter.cache_clear)
+
+        verse = Verse.objects.get(psalm__number=23, number=1)
+        verse.first_half = "The Lord is my shepherd;"
+        verse.save()
+        self.assertEqual(get_psalter().get(23, 1)[0], "The Lord is my shepherd;")
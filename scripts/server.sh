@@ -8,4 +8,5 @@ pip install -r requirements.txt
 
 python manage.py makemigrations
 python manage.py migrate
+python manage.py createcachetable
 python manage.py runserver
\ No newline at end of file
@@ -0,0 +1,258 @@
+"""A two-tier cache backend.
+
+Every worker process keeps a small in-memory LRU in front of a shared
+cache (configured as another alias in CACHES), so that hot keys are
+served without touching the shared cache at all.
+
+Workers stay coherent through a generation stamp kept in the shared cache.
+Overwriting an existing key with a different value, or deleting one,
+changes the stamp, and each worker checks the stamp at most every
+CHECK_INTERVAL seconds, dropping its local entries when it has changed. A
+local entry may therefore be stale for up to CHECK_INTERVAL seconds after
+another worker overwrites or deletes its key.
+
+Local entries are never kept for longer than LOCAL_TIMEOUT seconds (or the
+timeout they were set with), but values read from the shared cache are kept
+for LOCAL_TIMEOUT regardless of how long they have left there, since that
+isn't known. Once a key expires from the shared cache, writing it again is
+adding a new key, which doesn't change the stamp, so other workers may go
+on serving the old value for up to LOCAL_TIMEOUT seconds. Keys whose value
+must be seen promptly should be overwritten or deleted rather than left to
+expire.
+
+    CACHES = {
+        "default": {
+            "BACKEND": "website.cache.TieredCache",
+            "LOCATION": "default",
+            "OPTIONS": {
+                "SHARED": "shared",
+                "MAX_ENTRIES": 5000,
+                "MAX_SIZE": 32 * 1024 * 1024,
+                "LOCAL_TIMEOUT": 300,
+                "CHECK_INTERVAL": 5,
+            },
+        },
+        "shared": {...},
+    }
+"""
+
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+GENERATION_KEY = "tiered-cache:generation"
+
+_MISSING = object()
+
+# Local tiers are shared by every thread of a process, keyed by LOCATION
+_local_tiers = {}
+_local_tiers_lock = threading.Lock()
+
+
+class LocalTier:
+    """A bounded LRU of pickled values, evicting the least recently used
+    entries once there are too many of them or they take too much space.
+    """
+
+    def __init__(self, max_entries: int, max_size: int):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.size = 0
+        self.generation = None
+        self.next_check = 0.0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires, pickled = entry
+            if expires <= time.monotonic():
+                self._remove(key)
+                return _MISSING
+            self.entries.move_to_end(key)
+        return pickle.loads(pickled)
+
+    def set(self, key, value, timeout: float):
+        if timeout <= 0:
+            self.delete(key)
+            return
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self._remove(key)
+            if len(pickled) > self.max_size:
+                return
+            self.entries[key] = (time.monotonic() + timeout, pickled)
+            self.size += len(pickled)
+            while len(self.entries) > self.max_entries or self.size > self.max_size:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def delete(self, key):
+        with self.lock:
+            self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self.shared_alias = options.get("SHARED", "shared")
+        self.local_timeout = options.get("LOCAL_TIMEOUT", 300)
+        self.check_interval = options.get("CHECK_INTERVAL", 5)
+        with _local_tiers_lock:
+            if location not in _local_tiers:
+                _local_tiers[location] = LocalTier(
+                    self._max_entries, options.get("MAX_SIZE", 32 * 1024 * 1024)
+                )
+            self.local = _local_tiers[location]
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def get_local_timeout(self, timeout=DEFAULT_TIMEOUT):
+        if timeout is DEFAULT_TIMEOUT or timeout is None:
+            return self.local_timeout
+        return min(timeout, self.local_timeout)
+
+    def check_generation(self):
+        """Drop every local entry if another worker has changed the shared
+        cache since this one last looked.
+        """
+
+        now = time.monotonic()
+        if now < self.local.next_check:
+            return
+        self.local.next_check = now + self.check_interval
+        generation = self.shared.get(GENERATION_KEY)
+        if generation != self.local.generation:
+            self.local.clear()
+            self.local.generation = generation
+
+    def bump_generation(self):
+        generation = time.time_ns()
+        self.shared.set(GENERATION_KEY, generation, timeout=None)
+        # Changes made by other workers since the last check may not have
+        # been seen yet, so this worker starts over as well.
+        self.local.clear()
+        self.local.generation = generation
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        if not self.shared.add(key, value, timeout, version=version):
+            return False
+        self.local.set(local_key, value, self.get_local_timeout(timeout))
+        return True
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        self.check_generation()
+        value = self.local.get(local_key)
+        if value is not _MISSING:
+            return value
+        value = self.shared.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            return default
+        self.local.set(local_key, value, self.local_timeout)
+        return value
+
+    def get_many(self, keys, version=None):
+        self.check_generation()
+        found = {}
+        missing = []
+        for key in keys:
+            value = self.local.get(self.make_and_validate_key(key, version=version))
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing:
+            shared = self.shared.get_many(missing, version=version)
+            for key, value in shared.items():
+                local_key = self.make_and_validate_key(key, version=version)
+                self.local.set(local_key, value, self.local_timeout)
+            found.update(shared)
+        return found
+
+    def has_key(self, key, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        self.check_generation()
+        if self.local.get(local_key) is not _MISSING:
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        # Most keys are new, and adding them tells whether they existed
+        # without reading anything back
+        existing = {
+            key: value
+            for key, value in data.items()
+            if not self.shared.add(key, value, timeout, version=version)
+        }
+        failed = []
+        if existing:
+            # Only overwriting a key with a different value can leave stale
+            # copies in other workers (e.g. when workers which missed the
+            # same key at once all write it)
+            current = self.shared.get_many(existing, version=version)
+            changed = any(
+                key in current and current[key] != value
+                for key, value in existing.items()
+            )
+            failed = self.shared.set_many(existing, timeout, version=version)
+            if changed:
+                self.bump_generation()
+        for key, value in data.items():
+            if key not in failed:
+                local_key = self.make_and_validate_key(key, version=version)
+                self.local.set(local_key, value, self.get_local_timeout(timeout))
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self.local.delete(self.make_and_validate_key(key, version=version))
+        return self.shared.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        value = self.shared.incr(key, delta, version=version)
+        self.bump_generation()
+        self.local.set(local_key, value, self.local_timeout)
+        return value
+
+    def delete(self, key, version=None):
+        self.local.delete(self.make_and_validate_key(key, version=version))
+        deleted = self.shared.delete(key, version=version)
+        if deleted:
+            self.bump_generation()
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        for key in keys:
+            self.local.delete(self.make_and_validate_key(key, version=version))
+        self.shared.delete_many(keys, version=version)
+        self.bump_generation()
+
+    def clear(self):
+        self.shared.clear()
+        self.bump_generation()
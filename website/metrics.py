@@ -0,0 +1,94 @@
+"""Prometheus metrics, served at /metrics.
+
+Under gunicorn every worker is a separate process, so the metrics are kept
+in prometheus_client's multiprocess mode: each worker writes its samples to
+files in PROMETHEUS_MULTIPROC_DIR, and whichever worker is scraped adds
+them all up. The directory must be set (and empty) before gunicorn starts,
+which gunicorn.conf.py takes care of. Without it, each process simply
+serves its own metrics.
+
+Only staff, and addresses in the METRICS_ALLOWED_IPS setting (addresses or
+networks, e.g. "10.0.0.0/8"), may read them.
+
+The calendar cache hit ratio is left to the query, e.g.
+
+    sum(rate(lectionary_calendar_cache_total{result="hit"}[5m]))
+      / sum(rate(lectionary_calendar_cache_total[5m]))
+"""
+
+import ipaddress
+import os
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+REQUEST_LATENCY = Histogram(
+    "lectionary_request_duration_seconds",
+    "Time taken to respond to a request, by view.",
+    ["view"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUESTS = Counter(
+    "lectionary_requests_total",
+    "Requests answered, by view and status code.",
+    ["view", "status"],
+)
+LESSON_CACHE = Counter(
+    "lectionary_lesson_cache_total",
+    "Lessons served from the cache (hit) or fetched first (miss), by source.",
+    ["source", "result"],
+)
+ESV_LATENCY = Histogram(
+    "lectionary_esv_request_duration_seconds",
+    "Time taken by each request to the ESV API.",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16),
+)
+ESV_ERRORS = Counter(
+    "lectionary_esv_errors_total",
+    "Failed requests to the ESV API (or calls refused by the circuit breaker).",
+    ["kind"],
+)
+CALENDAR_CACHE = Counter(
+    "lectionary_calendar_cache_total",
+    "Calendar fragments served from the cache (hit) or built (miss).",
+    ["result"],
+)
+
+
+def get_registry():
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def is_allowed(request) -> bool:
+    if request.user.is_staff:
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network, strict=False)
+        for network in getattr(settings, "METRICS_ALLOWED_IPS", [])
+    )
+
+
+def metrics(request):
+    if not is_allowed(request):
+        raise PermissionDenied
+    return HttpResponse(
+        generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST
+    )
@@ -43,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so that it times everything else
+    "website.timing.TimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -140,10 +142,53 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 CACHES = {
+    # A per-worker in-memory cache in front of the shared cache below
     "default": {
+        "BACKEND": "website.cache.TieredCache",
+        "LOCATION": "default",
+        "OPTIONS": {
+            "SHARED": "shared",
+            "MAX_ENTRIES": 5000,
+            "MAX_SIZE": 32 * 1024 * 1024,
+            "LOCAL_TIMEOUT": 300,
+            "CHECK_INTERVAL": 5,
+        },
+    },
+    "shared": {
         "BACKEND": "django.core.cache.backends.db.DatabaseCache",
         "LOCATION": "cache_table",
-    }
+        # The calendar caches an entry for every date it is asked about
+        "OPTIONS": {"MAX_ENTRIES": 50000},
+    },
+}
+
+# Where the passages of lessons other than psalms come from. To work without
+# the ESV API, build an index with `manage.py build_bible_index` and use
+# "lectionary.services.scripture.LocalProvider" (with an optional "PATH"
+# in OPTIONS, data/bible.idx by default).
+SCRIPTURE_PROVIDER = {
+    "BACKEND": "lectionary.services.scripture.ESVProvider",
+}
+
+# Lessons which are not cached yet are either fetched while the page waits
+# ("inline"), or queued for the `manage.py fetch_lessons` worker ("queue"),
+# in which case the page polls for them every POLL_INTERVAL seconds.
+LESSON_FETCH = {
+    "MODE": "inline",
+    "POLL_INTERVAL": 2,
+}
+
+# Addresses (or networks) which may read the Prometheus metrics at /metrics,
+# besides staff, separated by spaces (e.g. "10.0.0.5 192.168.1.0/24")
+METRICS_ALLOWED_IPS = os.environ.get("METRICS_ALLOWED_IPS", "").split()
+
+# Every response gets a Server-Timing header, and a JSON line with its timings
+# is logged to "website.timing". Requests slower than SLOW_REQUEST_MS are also
+# logged with their queries, SLOW_SAMPLE_RATE of the time.
+REQUEST_TIMING = {
+    "SERVER_TIMING": True,
+    "SLOW_REQUEST_MS": 500,
+    "SLOW_SAMPLE_RATE": 0.1,
 }
 
 LOGGING = {
@@ -163,7 +208,12 @@ LOGGING = {
             "handlers": ["console"],
             "level": os.getenv("DJANGO_LOG_LEVEL", "INFO"),
             "propagate": False,
-        }
+        },
+        "website.timing": {
+            "handlers": ["console"],
+            "level": os.getenv("TIMING_LOG_LEVEL", "INFO"),
+            "propagate": False,
+        },
     },
 }
 
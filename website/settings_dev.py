@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so that it times everything else
+    "website.timing.TimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -133,10 +136,53 @@ STATICFILES_DIRS = [
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 CACHES = {
+    # A per-worker in-memory cache in front of the shared cache below
     "default": {
-        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
-        "LOCATION": "cache_table",
-    }
+        "BACKEND": "website.cache.TieredCache",
+        "LOCATION": "default",
+        "OPTIONS": {
+            "SHARED": "shared",
+            "MAX_ENTRIES": 5000,
+            "MAX_SIZE": 32 * 1024 * 1024,
+            "LOCAL_TIMEOUT": 300,
+            "CHECK_INTERVAL": 5,
+        },
+    },
+    "shared": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / ".cache",
+        # The calendar caches an entry for every date it is asked about
+        "OPTIONS": {"MAX_ENTRIES": 50000},
+    },
+}
+
+# Where the passages of lessons other than psalms come from. To work without
+# the ESV API, build an index with `manage.py build_bible_index` and use
+# "lectionary.services.scripture.LocalProvider" (with an optional "PATH"
+# in OPTIONS, data/bible.idx by default).
+SCRIPTURE_PROVIDER = {
+    "BACKEND": "lectionary.services.scripture.ESVProvider",
+}
+
+# Lessons which are not cached yet are either fetched while the page waits
+# ("inline"), or queued for the `manage.py fetch_lessons` worker ("queue"),
+# in which case the page polls for them every POLL_INTERVAL seconds.
+LESSON_FETCH = {
+    "MODE": "inline",
+    "POLL_INTERVAL": 2,
+}
+
+# Addresses (or networks) which may read the Prometheus metrics at /metrics,
+# besides staff
+METRICS_ALLOWED_IPS = ["127.0.0.1", "::1"]
+
+# Every response gets a Server-Timing header, and a JSON line with its timings
+# is logged to "website.timing". Requests slower than SLOW_REQUEST_MS are also
+# logged with their queries, SLOW_SAMPLE_RATE of the time.
+REQUEST_TIMING = {
+    "SERVER_TIMING": True,
+    "SLOW_REQUEST_MS": 500,
+    "SLOW_SAMPLE_RATE": 0.1,
 }
 
 LOGGING = {
@@ -151,4 +197,12 @@ LOGGING = {
         "handlers": ["console"],
         "level": "WARNING",
     },
+    "loggers": {
+        # Only slow requests, since every response has a Server-Timing header
+        "website.timing": {
+            "handlers": ["console"],
+            "level": os.getenv("TIMING_LOG_LEVEL", "WARNING"),
+            "propagate": False,
+        },
+    },
 }
@@ -0,0 +1,280 @@
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+
+import json
+from unittest import mock
+
+from prometheus_client import REGISTRY
+
+from website import timing
+from website.cache import LocalTier, TieredCache, _local_tiers
+
+
+@override_settings(
+    CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "shared": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "tiered-shared",
+        },
+    }
+)
+class TieredCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        caches["shared"].clear()
+        _local_tiers.clear()
+
+    def worker(self, name, **options):
+        """Return the cache as seen by a separate worker process."""
+
+        options = {"SHARED": "shared", "CHECK_INTERVAL": 0, **options}
+        return TieredCache(name, {"OPTIONS": options})
+
+    def test_local_hits(self):
+        """Values are served from memory once they have been read."""
+
+        cache = self.worker("a")
+        caches["shared"].set("key", "value")
+        self.assertEqual(cache.get("key"), "value")
+
+        with mock.patch.object(caches["shared"], "get") as shared_get:
+            shared_get.return_value = None
+            self.assertEqual(cache.get("key"), "value")
+            self.assertEqual(cache.get_many(["key"]), {"key": "value"})
+        self.assertIsNone(cache.get("missing"))
+
+    def test_workers_stay_coherent(self):
+        """Overwriting or deleting a key in one worker is seen by the rest."""
+
+        a = self.worker("a")
+        b = self.worker("b")
+        a.set("key", 1)
+        self.assertEqual(b.get("key"), 1)
+
+        a.set("key", 2)
+        self.assertEqual(b.get("key"), 2)
+
+        a.set_many({"key": 3, "other": 4})
+        self.assertEqual(b.get_many(["key", "other"]), {"key": 3, "other": 4})
+
+        self.assertEqual(a.incr("key"), 4)
+        self.assertEqual(b.get("key"), 4)
+
+        a.delete("key")
+        self.assertIsNone(b.get("key"))
+
+        a.clear()
+        self.assertIsNone(b.get("other"))
+
+    def test_check_interval(self):
+        """Workers only check for changes every CHECK_INTERVAL seconds."""
+
+        a = self.worker("a")
+        b = self.worker("b", CHECK_INTERVAL=60)
+        a.set("key", 1)
+        self.assertEqual(b.get("key"), 1)
+        a.set("key", 2)
+        self.assertEqual(b.get("key"), 1)
+
+        b.local.next_check = 0
+        self.assertEqual(b.get("key"), 2)
+
+    def test_new_keys_keep_local_entries(self):
+        """Adding new keys does not drop what other workers hold."""
+
+        a = self.worker("a")
+        b = self.worker("b")
+        a.set("key", 1)
+        b.get("key")
+        a.set_many({"new": 2})
+        a.add("added", 3)
+        self.assertEqual(b.local.get(b.make_key("key")), 1)
+
+    def test_same_value_keeps_local_entries(self):
+        """Writing a key again with the value it already has does not drop
+        what other workers hold, nor read back keys which are new.
+        """
+
+        a = self.worker("a")
+        b = self.worker("b")
+        a.set_many({"key": 1, "other": 2})
+        b.get_many(["key", "other"])
+        with mock.patch.object(
+            caches["shared"], "get_many", wraps=caches["shared"].get_many
+        ) as get_many:
+            a.set_many({"key": 1, "new": 3})
+            a.set("key", 1)
+        self.assertEqual(b.local.get(b.make_key("other")), 2)
+        self.assertEqual(b.get("key"), 1)
+        self.assertEqual(
+            [call.args[0] for call in get_many.call_args_list],
+            [{"key": 1}, {"key": 1}],
+        )
+
+        a.set_many({"key": 4})
+        self.assertEqual(b.get("key"), 4)
+
+    def test_get_or_set(self):
+        cache = self.worker("a")
+        self.assertEqual(cache.get_or_set("key", lambda: 1), 1)
+        self.assertEqual(cache.get_or_set("key", lambda: 2), 1)
+
+
+class LocalTierTestCase(SimpleTestCase):
+    def test_lru_eviction(self):
+        """The least recently used entries are evicted first."""
+
+        tier = LocalTier(max_entries=2, max_size=1024)
+        tier.set("a", 1, 60)
+        tier.set("b", 2, 60)
+        tier.get("a")
+        tier.set("c", 3, 60)
+        self.assertEqual(list(tier.entries), ["a", "c"])
+
+    def test_size_eviction(self):
+        """Entries are evicted once they take up too much space."""
+
+        tier = LocalTier(max_entries=100, max_size=1024)
+        for i in range(10):
+            tier.set(i, "x" * 300, 60)
+        self.assertLessEqual(tier.size, 1024)
+        self.assertEqual(list(tier.entries), [7, 8, 9])
+
+        tier.set("big", "x" * 2048, 60)
+        self.assertNotIn("big", tier.entries)
+
+    @mock.patch("website.cache.time.monotonic")
+    def test_expiry(self, monotonic):
+        """Entries expire after their timeout."""
+
+        monotonic.return_value = 100.0
+        tier = LocalTier(max_entries=100, max_size=1024)
+        tier.set("a", 1, 10)
+        monotonic.return_value = 109.0
+        self.assertEqual(tier.get("a"), 1)
+        monotonic.return_value = 110.0
+        self.assertIsNot(tier.get("a"), 1)
+        self.assertEqual(tier.size, 0)
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "timing",
+            "OPTIONS": {"MAX_ENTRIES": 50000},
+        }
+    }
+)
+class TimingMiddlewareTestCase(TestCase):
+    url = "/?start=2024-12-01&end=2024-12-31"
+
+    def setUp(self):
+        caches["default"].clear()
+
+    def test_server_timing(self):
+        """Queries, calendar cache hits and rendering are timed."""
+
+        response = self.client.get(self.url)
+        metrics = {
+            metric.split(";")[0]: metric
+            for metric in response["Server-Timing"].split(", ")
+        }
+        self.assertEqual(set(metrics), {"db", "lectionary", "render", "total"})
+        self.assertIn('desc="1x"', metrics["db"])
+
+    def test_log(self):
+        """Each request is logged as a line of JSON."""
+
+        self.client.get(self.url)
+        with self.assertLogs("website.timing", "INFO") as logs:
+            self.client.get(self.url)
+        [record] = logs.records
+        data = json.loads(record.getMessage())
+        self.assertEqual(data["view"], "index")
+        self.assertEqual(data["status"], 200)
+        self.assertEqual(data["counts"]["calendar_hit"], 31)
+        self.assertNotIn("db", data["counts"])
+        self.assertNotIn("queries", data)
+
+    @override_settings(REQUEST_TIMING={"SLOW_REQUEST_MS": 0, "SLOW_SAMPLE_RATE": 1})
+    def test_slow_requests(self):
+        """A sample of slow requests is logged with their queries."""
+
+        with self.assertLogs("website.timing", "WARNING") as logs:
+            self.client.get(self.url)
+        data = json.loads(logs.records[0].getMessage())
+        self.assertEqual(len(data["queries"]), data["counts"]["db"])
+        self.assertIn("SELECT", data["queries"][0]["sql"])
+
+    def test_outside_requests(self):
+        """Timings outside of a request are ignored."""
+
+        with timing.timed("esv"):
+            timing.count("lesson_hit")
+        self.assertIsNone(timing.current.get())
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "metrics",
+            "OPTIONS": {"MAX_ENTRIES": 50000},
+        }
+    }
+)
+class MetricsTestCase(TestCase):
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_metrics(self):
+        """Requests and calendar cache hits are counted, and served to
+        Prometheus.
+        """
+
+        caches["default"].clear()
+        requests = self.sample(
+            "lectionary_request_duration_seconds_count", view="index"
+        )
+        hits = self.sample("lectionary_calendar_cache_total", result="hit")
+        misses = self.sample("lectionary_calendar_cache_total", result="miss")
+
+        url = "/?start=2024-12-01&end=2024-12-31"
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(
+            self.sample("lectionary_request_duration_seconds_count", view="index"),
+            requests + 2,
+        )
+        self.assertEqual(
+            self.sample("lectionary_calendar_cache_total", result="miss"), misses + 31
+        )
+        self.assertEqual(
+            self.sample("lectionary_calendar_cache_total", result="hit"), hits + 31
+        )
+
+        with self.settings(METRICS_ALLOWED_IPS=["10.0.0.0/8", "127.0.0.1"]):
+            response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("text/plain", response["Content-Type"])
+        self.assertIn(
+            'lectionary_requests_total{status="200",view="index"}',
+            response.content.decode(),
+        )
+
+    def test_metrics_allowed(self):
+        """Metrics are only served to staff and allowed addresses."""
+
+        with self.settings(METRICS_ALLOWED_IPS=["10.0.0.0/8"]):
+            response = self.client.get("/metrics", REMOTE_ADDR="10.1.2.3")
+            self.assertEqual(response.status_code, 200)
+            with self.assertLogs("django.request", "WARNING"):
+                response = self.client.get("/metrics")
+            self.assertEqual(response.status_code, 403)
+
+            user = User.objects.create_user("staff", is_staff=True)
+            self.client.force_login(user)
+            response = self.client.get("/metrics")
+            self.assertEqual(response.status_code, 200)
@@ -0,0 +1,208 @@
+"""Per-request timings.
+
+TimingMiddleware keeps a RequestTimings for the request being served in a
+context variable, which the rest of the code adds to with `timed()` (for
+time spent on, say, the ESV API or rendering) and `count()` (for cache hits
+and misses). Every query is timed by a hook installed on each database
+connection. Context variables follow the request into sync_to_async and
+async_to_sync, so async views are timed the same way as sync ones.
+
+Durations are summed over every call, so calls made concurrently (like
+the ESV requests for a day's lessons) can add up to more than the request.
+
+Once the response is ready, the timings are sent back in a Server-Timing
+header, and logged as a single JSON line to the "website.timing" logger
+(and the request's latency is added to the metrics).
+A sample of slow requests is also logged with the queries they made:
+
+    REQUEST_TIMING = {
+        "SERVER_TIMING": True,
+        "SLOW_REQUEST_MS": 500,
+        "SLOW_SAMPLE_RATE": 0.1,
+    }
+"""
+
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from website import metrics
+
+# Slow requests are logged with (at most) this many of their queries
+MAX_QUERIES = 200
+
+logger = logging.getLogger("website.timing")
+
+current: ContextVar["RequestTimings | None"] = ContextVar("timings", default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.durations = defaultdict(float)
+        self.counts = Counter()
+        self.queries = []
+        # Passages may be fetched from several threads at once
+        self.lock = threading.Lock()
+
+    def add(self, name: str, duration: float):
+        with self.lock:
+            self.durations[name] += duration
+            self.counts[name] += 1
+
+    def add_query(self, sql: str, duration: float):
+        with self.lock:
+            self.durations["db"] += duration
+            self.counts["db"] += 1
+            if len(self.queries) < MAX_QUERIES:
+                self.queries.append((sql, duration))
+
+    def count(self, name: str, n: int = 1):
+        with self.lock:
+            self.counts[name] += n
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def server_timing(self) -> str:
+        metrics = [
+            f'{name};dur={duration * 1000:.1f};desc="{self.counts[name]}x"'
+            for name, duration in self.durations.items()
+        ]
+        metrics.append(f"total;dur={self.elapsed * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+@contextmanager
+def timed(name: str):
+    """Add the time spent in the block to the current request (if any)."""
+
+    timings = current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+def count(name: str, n: int = 1):
+    timings = current.get()
+    if timings is not None and n:
+        timings.count(name, n)
+
+
+def query_hook(execute, sql, params, many, context):
+    timings = current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add_query(sql, time.perf_counter() - start)
+
+
+def install_query_hook(connection, **kwargs):
+    if query_hook not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_hook)
+
+
+# New connections are hooked as they are opened, and those of the current
+# thread which were opened before this module was imported on each request
+connection_created.connect(install_query_hook)
+
+
+def get_options() -> dict:
+    return {
+        "SERVER_TIMING": True,
+        "SLOW_REQUEST_MS": 500,
+        "SLOW_SAMPLE_RATE": 0.1,
+        **getattr(settings, "REQUEST_TIMING", {}),
+    }
+
+
+class TimingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        for connection in connections.all(initialized_only=True):
+            install_query_hook(connection)
+        timings = RequestTimings()
+        token = current.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = current.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, timings)
+
+    def finish(self, request, response, timings: RequestTimings):
+        options = get_options()
+        if options["SERVER_TIMING"]:
+            response.headers["Server-Timing"] = timings.server_timing()
+
+        elapsed = timings.elapsed
+        elapsed_ms = elapsed * 1000
+        match = request.resolver_match
+        # Unmatched paths are lumped together, so that they can't be used to
+        # make up new series
+        view = match.view_name if match else "unmatched"
+        metrics.REQUEST_LATENCY.labels(view).observe(elapsed)
+        metrics.REQUESTS.labels(view, response.status_code).inc()
+
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "view": view,
+            "status": response.status_code,
+            "ms": round(elapsed_ms, 1),
+            "counts": dict(timings.counts),
+            "durations_ms": {
+                name: round(duration * 1000, 1)
+                for name, duration in timings.durations.items()
+            },
+        }
+        logger.info(json.dumps(record))
+
+        if (
+            elapsed_ms >= options["SLOW_REQUEST_MS"]
+            and random.random() < options["SLOW_SAMPLE_RATE"]
+        ):
+            record["queries"] = [
+                {"sql": sql, "ms": round(duration * 1000, 2)}
+                for sql, duration in timings.queries
+            ]
+            logger.warning(json.dumps(record))
+        return response